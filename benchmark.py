@@ -0,0 +1,216 @@
+import argparse
+import logging
+import os.path
+import tempfile
+import time
+
+import numpy as np
+
+from objects.AuthorizedPerson import AuthorizedPerson
+from objects.Config import Config
+from objects.FaceGallery import FaceGallery
+from objects.FaceHandler import FaceHandler
+from objects.FaceProcessPool import FaceProcessPool
+from objects.FaceRecognizer import FaceRecognizer
+from objects.FileCamera import FileCamera
+from objects.Metrics import Metrics
+from objects.util.detectorutils import create_detector
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Stages of the pipeline in the order they are run.
+stages = ["decode", "motion", "share", "convert", "detect", "encode", "match", "draw", "save", "total"]
+
+
+# Stands in for the RaspberryPi, so no pigpio daemon is needed.
+class StubRaspberryPi:
+    ip_address: str = "stub"
+    gpio_id: int = 0
+    duration: float = 0.0
+    current_state: bool = False
+    switches: int = 0
+
+    def is_connected(self):
+        return True
+
+    def switch_gpio(self, state: bool, seconds: float = 3):
+        self.current_state = state
+        self.switches += 1
+        return True
+
+
+# Random encodings with roughly the same scale as the ones of dlib.
+def synthetic_gallery(size: int, seed: int = 0) -> FaceGallery:
+    encodings = np.random.default_rng(seed).normal(0, 0.09, (size, FaceGallery.encoding_size))
+    persons = [AuthorizedPerson(f"Synthetic{i}", f"Synthetic{i}.png", "", encoding)
+               for i, encoding in enumerate(encodings)]
+
+    return FaceGallery(persons)
+
+
+# Encodings of faces of gallery persons, as seen by the camera.
+def synthetic_queries(gallery: FaceGallery, amount: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(gallery), amount)
+    noise = rng.normal(0, 0.3 / np.sqrt(FaceGallery.encoding_size), (amount, FaceGallery.encoding_size))
+    return (gallery.encodings[rows] + noise).astype(np.float32)
+
+
+def time_matches(gallery: FaceGallery, queries):
+    start = time.perf_counter()
+    matches = [gallery.match(query[np.newaxis])[0][0] for query in queries]
+    return np.array(matches), (time.perf_counter() - start) / len(queries)
+
+
+# Compare the approximate index with the exact comparison of every person.
+def print_index_report(sizes: list[int], probes: list[int], queries: int):
+    print()
+    print(f"Gallery index ({queries} faces per gallery)")
+    print(f"  {'persons':>8}{'probes':>8}{'build s':>10}{'ms/face':>10}{'exact ms':>10}{'recall':>8}")
+
+    for size in sizes:
+        gallery = synthetic_gallery(size)
+        faces = synthetic_queries(gallery, queries)
+        exact_matches, exact_seconds = time_matches(gallery, faces)
+
+        for probe in probes:
+            start = time.perf_counter()
+            indexed = gallery.with_index(probe)
+            build_seconds = time.perf_counter() - start
+
+            matches, seconds = time_matches(indexed, faces)
+            recall = np.mean(matches == exact_matches)
+            print(f"  {size:>8}{probe:>8}{build_seconds:>10.2f}{seconds * 1000:>10.3f}{exact_seconds * 1000:>10.3f}"
+                  f"{recall:>8.3f}")
+
+
+def max_memory_mb():
+    if resource is None:
+        return None
+
+    # Linux reports kilobytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Feed every frame of the source through the recognizer.
+def run(config: Config, source: str, face_handler: FaceHandler, detector, max_frames: int,
+        face_pool: FaceProcessPool = None):
+    metrics = Metrics()
+    camera = FileCamera(source, metrics, max_frames)
+    pi = StubRaspberryPi()
+    recognizer = FaceRecognizer(config, camera, pi, face_handler, detector, metrics, start=False,
+                                face_pool=face_pool)
+
+    sequence = 0
+    start = time.perf_counter()
+    while True:
+        sequence, borrowed = camera.wait_for_frame(sequence)
+        if borrowed is None:
+            break
+
+        with borrowed:
+            recognizer.process_frame(borrowed.frame)
+
+        # Close the door again, so every frame with an authorized person is saved.
+        pi.current_state = False
+
+    return metrics, camera.labels, sequence, time.perf_counter() - start
+
+
+def print_report(title: str, metrics: Metrics, labels: dict, frames: int, seconds: float):
+    print()
+    print(title)
+    print(f"  frames: {frames}, seconds: {seconds:.2f}, fps: {frames / seconds if seconds > 0 else 0:.2f}, "
+          f"faces: {metrics.get_counter('faces', labels)}, "
+          f"encoded: {metrics.get_counter('encoded_faces', labels)}, "
+          f"skipped without motion: {metrics.get_counter('frames_without_motion', labels)}")
+
+    memory = max_memory_mb()
+    if memory is not None:
+        print(f"  max memory: {memory:.1f} MB")
+
+    print(f"  {'stage':<10}{'count':>8}{'avg ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for stage in stages:
+        latency = metrics.get_latency(stage, labels)
+        if latency is None:
+            continue
+
+        latency = latency.to_json()
+        print(f"  {stage:<10}{latency['count']:>8}{latency['average_ms']:>10.2f}{latency['p50_ms']:>10.2f}"
+              f"{latency['p90_ms']:>10.2f}{latency['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition with a recorded video.")
+    parser.add_argument("source", nargs="?", help="Video file or folder of images. Leave empty to skip the runs.")
+    parser.add_argument("--config", default="config.ini", help="Config file with the recognition settings.")
+    parser.add_argument("--images", default=os.path.join("data", "images"),
+                        help="Folder of the reference images. Leave empty to skip the run with them.")
+    parser.add_argument("--frames", type=int, default=0, help="Maximum amount of frames per run, 0 for all.")
+    parser.add_argument("--gallery-sizes", default="10,100,1000,10000",
+                        help="Comma separated sizes of synthetic galleries. Leave empty to skip them.")
+    parser.add_argument("--index-sizes", default="",
+                        help="Comma separated sizes of synthetic galleries to compare the index with, e.g. 1000,10000.")
+    parser.add_argument("--index-probes", default="1,4,8,16", help="Comma separated amounts of searched clusters.")
+    parser.add_argument("--index-queries", type=int, default=500, help="Amount of faces matched per gallery.")
+    parser.add_argument("--process-workers", type=int, default=0,
+                        help="Detect and encode faces in this amount of processes, 0 to do it in the benchmark itself.")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s', level=logging.WARNING,
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+    config = Config(args.config)
+
+    # Allow toggling all day, so the history stage is part of the benchmark.
+    config.set_settings_allow_toggle_from(0)
+    config.set_settings_allow_toggle_to(24)
+
+    detector = create_detector(config)
+    face_pool = FaceProcessPool(config, args.process_workers, detector) if args.process_workers > 0 else None
+
+    with tempfile.TemporaryDirectory() as folder:
+        face_handler = FaceHandler(config.face_recognition_loader_workers())
+        face_handler.history_path = os.path.join(folder, "history")
+        face_handler.cache_path = os.path.join(folder, "cache")
+        face_handler.image_path = os.path.join(folder, "images")
+        face_handler.template_mode = config.face_recognition_templates()
+        face_handler.person_tolerances = config.person_tolerances()
+        face_handler.index_probes = config.face_recognition_index_probes()
+        face_handler.index_min_size = config.face_recognition_index_min_size()
+
+        if args.source:
+            if args.images:
+                face_handler.image_path = args.images
+                face_handler.cache_path = os.path.join(os.path.dirname(args.images) or ".", "cache")
+
+                start = time.perf_counter()
+                face_handler.load_images()
+                print(f"Loaded {len(face_handler.gallery)} reference images in {time.perf_counter() - start:.2f}s")
+
+                metrics, labels, frames, seconds = run(config, args.source, face_handler, detector, args.frames,
+                                                      face_pool)
+                print_report(f"Reference images ({len(face_handler.gallery)} persons, detector {detector.name})",
+                             metrics, labels, frames, seconds)
+
+            for size in [int(size) for size in args.gallery_sizes.split(",") if size.strip()]:
+                face_handler.gallery = synthetic_gallery(size)
+                if config.face_recognition_index_probes() > 0 and size >= config.face_recognition_index_min_size():
+                    face_handler.gallery = face_handler.gallery.with_index(config.face_recognition_index_probes())
+
+                metrics, labels, frames, seconds = run(config, args.source, face_handler, detector, args.frames,
+                                                      face_pool)
+                print_report(f"Synthetic gallery ({size} persons, detector {detector.name})",
+                             metrics, labels, frames, seconds)
+
+    index_sizes = [int(size) for size in args.index_sizes.split(",") if size.strip()]
+    if len(index_sizes) > 0:
+        print_index_report(index_sizes, [int(probe) for probe in args.index_probes.split(",") if probe.strip()],
+                           args.index_queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,10 +8,19 @@ from flask_cors import CORS
 
 from objects.Camera import Camera
 from objects.Config import Config
+from objects.EncodingBatcher import EncodingBatcher
 from objects.FaceHandler import FaceHandler
+from objects.FaceProcessPool import FaceProcessPool
 from objects.FaceRecognizer import FaceRecognizer
+from objects.HistorySweeper import HistorySweeper
+from objects.HistoryWriter import HistoryWriter
+from objects.ImageCache import ImageCache
+from objects.Metrics import Metrics
 from objects.RaspberryPi import RaspberryPi
+from objects.RecognitionScheduler import RecognitionScheduler
 from objects.api.ApiHandler import ApiHandler
+from objects.util.captureutils import capture_options
+from objects.util.detectorutils import create_detector
 
 logging.basicConfig(
     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -20,17 +29,77 @@ logging.basicConfig(
 
 config = Config("config.ini")
 
-camera = Camera(config.camera_stream_link())
+metrics = Metrics()
+
+# Load the faces first, so parallel encoding starts before any other thread is running.
+face_handler = FaceHandler(config.face_recognition_loader_workers())
+face_handler.template_mode = config.face_recognition_templates()
+face_handler.person_tolerances = config.person_tolerances()
+face_handler.index_probes = config.face_recognition_index_probes()
+face_handler.index_min_size = config.face_recognition_index_min_size()
+face_handler.history_format = config.history_format()
+face_handler.history_quality = config.history_quality()
+face_handler.thumbnail_width = config.history_thumbnail_width()
+face_handler.max_history_images = config.history_max_images()
+face_handler.max_history_bytes = int(config.history_max_size() * 1024 * 1024)
+face_handler.max_history_age = config.history_max_age()
+face_handler.max_history_images_per_person = config.history_max_images_per_person()
+face_handler.load_images()
 
-pi = RaspberryPi(config.pi_ip_address(), config.pi_gpio_id(), config.pi_output_duration(), config.pi_invert_output())
+detector = create_detector(config)
 
-face_handler = FaceHandler()
-face_handler.load_images()
+# Start the recognition processes before any thread, they are forked from this process.
+face_pool = None
+if config.face_recognition_process_workers() > 0:
+    if FaceProcessPool.is_supported():
+        face_pool = FaceProcessPool(config, config.face_recognition_process_workers(), detector)
+    else:
+        logging.warning("Recognition processes need the fork start method, detecting faces in threads instead.")
+
+# Encode the faces of all cameras together.
+encoder = None
+if config.face_recognition_encode_batch_size() > 0 and face_pool is not None:
+    logging.warning("Faces are encoded by the recognition processes, EncodeBatchSize is ignored.")
+elif config.face_recognition_encode_batch_size() > 0:
+    encoder = EncodingBatcher(detector, config.face_recognition_encode_batch_size(),
+                              config.face_recognition_encode_batch_max_wait() / 1000,
+                              min(config.face_recognition_workers(), len(config.camera_sections())), metrics)
+
+# Background threads of the history.
+if config.history_sweep_interval() > 0:
+    face_handler.history_sweeper = HistorySweeper(face_handler.cleanup_history, config.history_sweep_interval(),
+                                                  metrics)
+if config.history_queue_size() > 0:
+    face_handler.history_writer = HistoryWriter(face_handler.write_history_image, config.history_queue_size(),
+                                                metrics)
+
+# Every camera toggles its own output. All cameras share the same workers and authorized faces.
+# Cameras with the same output share one connection, so the output has one state and one timer.
+face_recognizers = []
+pis = {}
+for section in config.camera_sections():
+    name = config.camera_name(section)
+
+    camera = Camera(config.camera_stream_link(section), metrics, name, config.camera_frame_buffer(section),
+                    capture_options(config, section))
+
+    output = (config.pi_ip_address(section), config.pi_gpio_id(section))
+    pi = pis.get(output)
+    if pi is None:
+        pi = RaspberryPi(output[0], output[1], config.pi_output_duration(section), config.pi_invert_output(section),
+                         metrics, name)
+        pis[output] = pi
+    else:
+        logging.info(f"{name} shares the output of {pi.name}.")
 
-face_recognizer = FaceRecognizer(config, camera, pi, face_handler)
+    face_recognizers.append(FaceRecognizer(config, camera, pi, face_handler, detector, metrics, start=False,
+                                           face_pool=face_pool, encoder=encoder))
+
+scheduler = RecognitionScheduler(face_recognizers, config.face_recognition_workers(), metrics)
 
 # API
-api_handler = ApiHandler(config, camera, pi, face_handler)
+api_handler = ApiHandler(config, face_recognizers, face_handler, detector, metrics,
+                         ImageCache(int(config.api_image_cache_size() * 1024 * 1024), metrics))
 app = Flask(__name__)
 CORS(app)
 
@@ -40,19 +109,24 @@ def home():
     return api_handler.get_status()
 
 
+@app.route("/metrics")
+def metrics_text():
+    return api_handler.get_metrics()
+
+
 @app.route("/history")
 def history():
-    return api_handler.get_history()
+    return api_handler.get_history(flask.request.args)
 
 
 @app.route("/toggle/gpio/on/<arg>", methods=["POST"])
 def toggle_gpio_on(arg: str):
-    return api_handler.set_gpio_state(True, arg)
+    return api_handler.set_gpio_state(True, arg, flask.request.args.get("camera"))
 
 
 @app.route("/toggle/gpio/off", methods=["POST"])
 def toggle_gpio_off():
-    return api_handler.set_gpio_state(False, "1")
+    return api_handler.set_gpio_state(False, "1", flask.request.args.get("camera"))
 
 
 @app.route("/toggle/from/<arg>", methods=["POST"])
@@ -65,12 +139,27 @@ def toggle_to(arg: str):
     return api_handler.set_toggle_from(arg)
 
 
+@app.route("/regions", methods=["GET", "POST", "DELETE"])
+def regions():
+    if flask.request.method == "POST":
+        return api_handler.set_regions(flask.request.get_json(silent=True))
+    elif flask.request.method == "DELETE":
+        return api_handler.delete_regions()
+    else:
+        return api_handler.get_regions()
+
+
 @app.route("/history/<arg>", methods=["GET", "DELETE"])
 def history_image(arg: str):
     if flask.request.method == "DELETE":
         return api_handler.delete_history(arg)
     else:
-        return api_handler.get_history_image(arg)
+        return api_handler.get_history_image(arg, flask.request.args.get("width"))
+
+
+@app.route("/history/<arg>/thumbnail")
+def history_thumbnail(arg: str):
+    return api_handler.get_history_thumbnail(arg)
 
 
 @app.route("/authorized")
@@ -81,11 +170,11 @@ def authorized():
 @app.route("/authorized/<arg>", methods=["GET", "POST", "DELETE"])
 def authorized_image(arg: str):
     if flask.request.method == "POST":
-        return api_handler.create_authorized_person(arg)
+        return api_handler.create_authorized_person(arg, flask.request.args.get("camera"))
     elif flask.request.method == "DELETE":
         return api_handler.delete_authorized_person(arg)
     else:
-        return api_handler.get_authorized_person_image(arg)
+        return api_handler.get_authorized_person_image(arg, flask.request.args.get("width"))
 
 
 def run_api():
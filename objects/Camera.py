@@ -1,19 +1,50 @@
 import logging
 import time
-from threading import Thread
+from threading import Thread, Condition, Event
 
 import cv2
+import numpy as np
+
+from objects.CaptureOptions import CaptureOptions
+from objects.FrameRing import FrameRing, BorrowedFrame
+from objects.Metrics import Metrics
+from objects.util.captureutils import open_capture
 
 
 class Camera:
+    name: str
     stream_link: str
     capture = None
+    capture_options: CaptureOptions
+    # Full size frame, before it is scaled down to the decode width.
+    decode_buffer = None
 
     connected: bool = False
-    last_frame = None
 
-    def __init__(self, stream_link):
+    # Buffers of the newest frames and the sequence number of the newest one.
+    frames: FrameRing
+    frame_sequence: int = 0
+    # Sequence number of the last frame taken by wait_for_frame().
+    taken_sequence: int = 0
+
+    metrics: Metrics
+
+    def __init__(self, stream_link, metrics: Metrics = None, name: str = "Camera", buffer_size: int = 4,
+                 capture_options: CaptureOptions = None):
+        self.name = name
         self.stream_link = stream_link
+        self.capture_options = capture_options if capture_options is not None else CaptureOptions()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.labels = {"camera": name}
+        self.frames = FrameRing(buffer_size)
+
+        # Functions called after a new frame was stored.
+        self.frame_listeners = []
+
+        # Notified whenever a new frame was stored.
+        self.frame_condition = Condition()
+        # Set while the stream is connected.
+        self.connected_event = Event()
 
         self.connect()
 
@@ -31,25 +62,85 @@ class Camera:
             if not self.is_connected():
                 # Check last known state.
                 if self.connected:
-                    logging.warning("Lost connecting to video stream...")
+                    logging.warning(f"Lost connecting to video stream of {self.name}...")
 
                 self.disconnect()
+                # Frames from before the connection was lost are outdated.
+                self.frames.clear()
                 self.connect()
+                if self.connected:
+                    self.metrics.increment("camera_reconnects", labels=self.labels)
 
             time.sleep(5)
 
     # Grab frames as soon as they are available.
     def __reader(self):
         while True:
-            if self.is_connected():
-                success, frame = self.capture.read()
+            # Sleep until the stream is connected again.
+            if not self.is_connected():
+                self.connected_event.clear()
+                self.connected_event.wait(1)
+                continue
+
+            # Decode into the buffer of the oldest frame, that is not borrowed.
+            index, buffer = self.frames.acquire()
+            with self.metrics.time("camera_read", self.labels):
+                success = self.__skip_frames()
                 if success:
-                    self.last_frame = frame
-                else:
-                    logging.warning("Failed to read image. Disconnecting...")
-                    self.disconnect()
+                    success, frame = self.__read(buffer)
+
+            if success:
+                self.metrics.increment("camera_frames", labels=self.labels)
+
+                with self.frame_condition:
+                    # The previous frame is replaced before anyone took it.
+                    if self.frame_sequence > self.taken_sequence:
+                        self.metrics.increment("camera_dropped_frames", labels=self.labels)
 
-                cv2.waitKey(1)
+                    self.frame_sequence = self.frames.commit(index, frame)
+                    self.frame_condition.notify_all()
+
+                self.metrics.set_gauge("camera_replaced_buffers", self.frames.replaced_buffers, labels=self.labels)
+
+                # Called without holding the lock, so listeners can take their own locks.
+                for listener in self.frame_listeners:
+                    listener()
+            else:
+                logging.warning("Failed to read image. Disconnecting...")
+                self.disconnect()
+
+    # Grab the frames that are not analyzed, without converting them.
+    def __skip_frames(self):
+        for i in range(self.capture_options.frame_skip):
+            if not self.capture.grab():
+                return False
+
+        if self.capture_options.frame_skip > 0:
+            self.metrics.increment("camera_skipped_frames", self.capture_options.frame_skip, labels=self.labels)
+
+        return True
+
+    # Read the next frame into the buffer, scaled down to the decode width.
+    def __read(self, buffer):
+        width = self.capture_options.decode_width
+        if width <= 0 or self.capture_options.scaled_by_backend():
+            return self.capture.read(buffer)
+
+        success, frame = self.capture.read(self.decode_buffer)
+        if not success:
+            return False, None
+
+        self.decode_buffer = frame
+        if frame.shape[1] <= width:
+            # Keep using the buffers of the ring, they only have to be allocated again if the size changed.
+            if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+                return True, frame.copy()
+
+            np.copyto(buffer, frame)
+            return True, buffer
+
+        height = round(frame.shape[0] * width / frame.shape[1])
+        return True, cv2.resize(frame, (width, height), dst=buffer, interpolation=cv2.INTER_AREA)
 
     def is_connected(self):
         return self.capture is not None and self.capture.isOpened()
@@ -57,27 +148,42 @@ class Camera:
     # Connect to video device.
     def connect(self):
         logging.info(f"Trying to connect to video stream: {self.stream_link}")
-        try:
-            self.capture = cv2.VideoCapture(int(self.stream_link) + cv2.CAP_DSHOW)
-        except ValueError:
-            self.capture = cv2.VideoCapture(self.stream_link)
+        self.capture = open_capture(self.stream_link, self.capture_options)
 
         # Check if stream is reconnected.
         if self.is_connected():
             logging.info("Successfully connected to the video stream.")
             self.connected = True
+            self.connected_event.set()
         else:
             logging.warning("Failed to connect to the video stream.")
             self.connected = False
 
+        self.metrics.set_gauge("camera_connected", int(self.connected), labels=self.labels)
+
     def disconnect(self):
         if self.is_connected():
             self.capture.release()
 
         self.connected = False
-
-    def read(self):
-        if not self.is_connected():
-            return None
-
-        return None if self.last_frame is None else self.last_frame.copy()
+        self.connected_event.clear()
+        self.metrics.set_gauge("camera_connected", 0, labels=self.labels)
+
+    # Borrow up to count of the newest frames, newest first. They have to be released after use.
+    def recent_frames(self, count: int = None) -> list[BorrowedFrame]:
+        return self.frames.recent(count)
+
+    # Block until a frame newer than the given sequence number arrived.
+    # Returns the sequence number and the borrowed frame, or None as frame after the timeout.
+    # The frame is shared, so copy it before modifying it and release it after use.
+    def wait_for_frame(self, last_sequence: int, timeout: float = 1.0):
+        with self.frame_condition:
+            if not self.frame_condition.wait_for(lambda: self.frame_sequence != last_sequence, timeout):
+                return last_sequence, None
+
+            borrowed = self.frames.borrow(self.frame_sequence)
+            if borrowed is None:
+                return last_sequence, None
+
+            self.taken_sequence = self.frame_sequence
+            return self.frame_sequence, borrowed
@@ -0,0 +1,40 @@
+# Settings of the video capture of a camera.
+class CaptureOptions:
+    # auto, ffmpeg or gstreamer.
+    backend: str = "auto"
+    # Custom GStreamer pipeline, that replaces the stream link.
+    pipeline: str = ""
+    # tcp or udp for rtsp streams, empty for the default of the backend.
+    transport: str = ""
+    # Amount of frames buffered by the backend, 0 for its default.
+    buffer_size: int = 0
+    hardware_decoding: bool = False
+    # Width (in px) frames are scaled down to, 0 to keep the resolution of the stream.
+    decode_width: int = 0
+    # Amount of frames skipped without converting them, after every frame that is read.
+    frame_skip: int = 0
+
+    def __init__(self, backend: str = "auto", pipeline: str = "", transport: str = "", buffer_size: int = 0,
+                 hardware_decoding: bool = False, decode_width: int = 0, frame_skip: int = 0):
+        self.backend = backend.lower()
+        self.pipeline = pipeline
+        self.transport = transport.lower()
+        self.buffer_size = buffer_size
+        self.hardware_decoding = hardware_decoding
+        self.decode_width = decode_width
+        self.frame_skip = frame_skip
+
+    # The pipeline built for the gstreamer backend already scales the frames down.
+    def scaled_by_backend(self) -> bool:
+        return self.backend == "gstreamer" and len(self.pipeline) == 0
+
+    def to_json(self):
+        return {
+            "backend": self.backend,
+            "pipeline": len(self.pipeline) > 0,
+            "transport": self.transport,
+            "buffer_size": self.buffer_size,
+            "hardware_decoding": self.hardware_decoding,
+            "decode_width": self.decode_width,
+            "frame_skip": self.frame_skip
+        }
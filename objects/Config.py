@@ -2,10 +2,14 @@ import logging
 import os.path
 from configparser import ConfigParser
 
+from objects.util.regionutils import parse_regions, regions_to_string, is_valid_region
+
 
 class Config:
     config_path: str = None
     config: ConfigParser = ConfigParser()
+    # Regions of interest, parsed once instead of for every frame.
+    regions: list = []
 
     def __init__(self, config_path):
         self.config_path = config_path
@@ -18,24 +22,199 @@ class Config:
 
         self.config.read(self.config_path)
 
-    def camera_stream_link(self):
-        return self.config.get("Camera", "Stream-URL")
+        # Fail at startup, not on every frame.
+        try:
+            self.regions = parse_regions(self.config.get("Face Recognition", "RegionsOfInterest", fallback=""))
+        except ValueError as e:
+            raise ValueError(f"Invalid RegionsOfInterest in {self.config_path}: {e}") from e
+
+    # Sections of all cameras, e.g. [Camera] and [Camera Backdoor].
+    def camera_sections(self):
+        return [section for section in self.config.sections() if section == "Camera" or section.startswith("Camera ")]
+
+    @staticmethod
+    def camera_name(section: str = "Camera"):
+        return section[len("Camera "):].strip() if section.startswith("Camera ") else section
+
+    def camera_stream_link(self, section: str = "Camera"):
+        return self.config.get(section, "Stream-URL")
+
+    def camera_frame_buffer(self, section: str = "Camera"):
+        return self.config.getint(section, "FrameBuffer", fallback=self.config.getint("Camera", "FrameBuffer",
+                                                                                      fallback=4))
+
+    def camera_capture_backend(self, section: str = "Camera"):
+        return self.config.get(section, "Backend", fallback=self.config.get("Camera", "Backend", fallback="auto"))
+
+    def camera_capture_pipeline(self, section: str = "Camera"):
+        return self.config.get(section, "Pipeline", fallback="")
 
-    def pi_ip_address(self):
-        return self.config.get("Raspberry Pi", "IP-Address")
+    def camera_rtsp_transport(self, section: str = "Camera"):
+        return self.config.get(section, "Transport", fallback=self.config.get("Camera", "Transport", fallback=""))
 
-    def pi_gpio_id(self):
-        return self.config.getint("Raspberry Pi", "GPIO")
+    def camera_capture_buffer_size(self, section: str = "Camera"):
+        return self.config.getint(section, "BufferSize", fallback=self.config.getint("Camera", "BufferSize",
+                                                                                     fallback=0))
 
-    def pi_output_duration(self):
-        return self.config.getfloat("Raspberry Pi", "OutputDuration")
+    def camera_hardware_decoding(self, section: str = "Camera"):
+        return self.config.getboolean(section, "HardwareDecoding",
+                                      fallback=self.config.getboolean("Camera", "HardwareDecoding", fallback=False))
 
-    def pi_invert_output(self):
-        return self.config.getboolean("Raspberry Pi", "InvertOutput")
+    def camera_decode_width(self, section: str = "Camera"):
+        return self.config.getint(section, "DecodeWidth", fallback=self.config.getint("Camera", "DecodeWidth",
+                                                                                      fallback=0))
+
+    def camera_frame_skip(self, section: str = "Camera"):
+        return self.config.getint(section, "FrameSkip", fallback=self.config.getint("Camera", "FrameSkip",
+                                                                                    fallback=0))
+
+    # The output of every camera can be set in its section, otherwise the [Raspberry Pi] section is used.
+    def pi_ip_address(self, section: str = "Raspberry Pi"):
+        return self.config.get(section, "IP-Address", fallback=self.config.get("Raspberry Pi", "IP-Address"))
+
+    def pi_gpio_id(self, section: str = "Raspberry Pi"):
+        return self.config.getint(section, "GPIO", fallback=self.config.getint("Raspberry Pi", "GPIO"))
+
+    def pi_output_duration(self, section: str = "Raspberry Pi"):
+        return self.config.getfloat(section, "OutputDuration",
+                                    fallback=self.config.getfloat("Raspberry Pi", "OutputDuration"))
+
+    def pi_invert_output(self, section: str = "Raspberry Pi"):
+        return self.config.getboolean(section, "InvertOutput",
+                                      fallback=self.config.getboolean("Raspberry Pi", "InvertOutput"))
 
     def face_recognition_tolerance(self):
         return self.config.getfloat("Face Recognition", "Tolerance")
 
+    def face_recognition_detection_scale(self):
+        return self.config.getfloat("Face Recognition", "DetectionScale", fallback=1.0)
+
+    def face_recognition_detector(self):
+        return self.config.get("Face Recognition", "Detector", fallback="hog")
+
+    def face_recognition_haar_prefilter(self):
+        return self.config.getboolean("Face Recognition", "HaarPrefilter", fallback=False)
+
+    def face_recognition_upsample(self):
+        return self.config.getint("Face Recognition", "Upsample", fallback=1)
+
+    def face_recognition_yunet_model(self):
+        return self.config.get("Face Recognition", "YuNetModel",
+                               fallback=os.path.join("data", "models", "face_detection_yunet_2023mar.onnx"))
+
+    def face_recognition_regions(self):
+        return self.regions
+
+    def set_face_recognition_regions(self, regions) -> bool:
+        if not all(is_valid_region(region) for region in regions):
+            return False
+        self.config.set("Face Recognition", "RegionsOfInterest", regions_to_string(regions))
+        self.regions = parse_regions(regions_to_string(regions))
+        return True
+
+    def face_recognition_workers(self):
+        return self.config.getint("Face Recognition", "Workers", fallback=1)
+
+    def face_recognition_loader_workers(self):
+        return self.config.getint("Face Recognition", "LoaderWorkers", fallback=0)
+
+    def face_recognition_process_workers(self):
+        return self.config.getint("Face Recognition", "ProcessWorkers", fallback=0)
+
+    def face_recognition_encode_batch_size(self):
+        return self.config.getint("Face Recognition", "EncodeBatchSize", fallback=0)
+
+    def face_recognition_encode_batch_max_wait(self):
+        return self.config.getfloat("Face Recognition", "EncodeBatchMaxWait", fallback=20)
+
+    def face_recognition_templates(self):
+        return self.config.get("Face Recognition", "Templates", fallback="all")
+
+    # Tolerances of single persons by lower case name.
+    def person_tolerances(self):
+        if not self.config.has_section("Tolerances"):
+            return {}
+
+        return {name: self.config.getfloat("Tolerances", name) for name in self.config.options("Tolerances")}
+
+    def face_recognition_index_probes(self):
+        return self.config.getint("Face Recognition", "IndexProbes", fallback=0)
+
+    def face_recognition_index_min_size(self):
+        return self.config.getint("Face Recognition", "IndexMinSize", fallback=1000)
+
+    def motion_detection_enabled(self):
+        return self.config.getboolean("Motion Detection", "Enabled", fallback=False)
+
+    def motion_detection_sensitivity(self):
+        return self.config.getint("Motion Detection", "Sensitivity", fallback=25)
+
+    def motion_detection_min_changed_area(self):
+        return self.config.getfloat("Motion Detection", "MinChangedArea", fallback=0.005)
+
+    def motion_detection_cooldown(self):
+        return self.config.getfloat("Motion Detection", "Cooldown", fallback=3.0)
+
+    def tracking_enabled(self):
+        return self.config.getboolean("Tracking", "Enabled", fallback=False)
+
+    def tracking_min_overlap(self):
+        return self.config.getfloat("Tracking", "MinOverlap", fallback=0.3)
+
+    def tracking_reverify_overlap(self):
+        return self.config.getfloat("Tracking", "ReverifyOverlap", fallback=0.6)
+
+    def tracking_reverify_interval(self):
+        return self.config.getfloat("Tracking", "ReverifyInterval", fallback=1.0)
+
+    def tracking_max_missed_frames(self):
+        return self.config.getint("Tracking", "MaxMissedFrames", fallback=5)
+
+    def decision_vote_enabled(self):
+        return self.config.getboolean("Decision", "Enabled", fallback=False)
+
+    def decision_vote_frames(self):
+        return self.config.getint("Decision", "Frames", fallback=5)
+
+    def decision_vote_required_frames(self):
+        return self.config.getint("Decision", "RequiredFrames", fallback=3)
+
+    def decision_vote_max_mean_distance(self):
+        return self.config.getfloat("Decision", "MaxMeanDistance", fallback=0.0)
+
+    def decision_vote_by(self):
+        return self.config.get("Decision", "VoteBy", fallback="identity")
+
+    def history_format(self):
+        return self.config.get("History", "Format", fallback="png")
+
+    def history_quality(self):
+        return self.config.getint("History", "Quality", fallback=90)
+
+    def history_thumbnail_width(self):
+        return self.config.getint("History", "ThumbnailWidth", fallback=0)
+
+    def history_max_images(self):
+        return self.config.getint("History", "MaxImages", fallback=100)
+
+    def history_max_size(self):
+        return self.config.getfloat("History", "MaxSizeMB", fallback=0)
+
+    def history_max_age(self):
+        return self.config.getfloat("History", "MaxAgeDays", fallback=0)
+
+    def history_max_images_per_person(self):
+        return self.config.getint("History", "MaxImagesPerPerson", fallback=0)
+
+    def history_sweep_interval(self):
+        return self.config.getfloat("History", "SweepInterval", fallback=0)
+
+    def history_queue_size(self):
+        return self.config.getint("History", "QueueSize", fallback=0)
+
+    def api_image_cache_size(self):
+        return self.config.getfloat("API", "ImageCacheMB", fallback=16)
+
     def settings_unknown_name(self):
         return self.config.get("Settings", "UnknownName")
 
@@ -0,0 +1,121 @@
+import logging
+import time
+from threading import Thread, Condition, Event
+
+from objects.Metrics import Metrics
+from objects.detector.FaceDetector import FaceDetector
+
+
+# Faces of a single frame, that wait for their encodings.
+class EncodingRequest:
+    def __init__(self, image, face_locations):
+        self.image = image
+        self.face_locations = face_locations
+        self.time = time.perf_counter()
+
+        self.done = Event()
+        self.encodings = None
+        self.error = None
+
+
+# Collects the faces of frames analyzed at the same time, e.g. of several cameras, and encodes them in one call.
+# A batch is encoded as soon as it holds batch_size faces, every thread that can send faces is waiting,
+# or its oldest frame waited max_wait seconds.
+class EncodingBatcher:
+    detector: FaceDetector
+    metrics: Metrics
+
+    # Amount of faces encoded together at most.
+    batch_size: int
+    max_wait: float
+    # Amount of threads that can request encodings at the same time.
+    producers: int
+
+    def __init__(self, detector: FaceDetector, batch_size: int = 8, max_wait: float = 0.02, producers: int = 1,
+                 metrics: Metrics = None):
+        self.detector = detector
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.producers = max(1, producers)
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.condition = Condition()
+        self.pending: list[EncodingRequest] = []
+
+        logging.info(f"Encoding up to {self.batch_size} faces together, waiting at most {self.max_wait * 1000:.0f} ms.")
+
+        self.thread = Thread(target=self.__work, name="EncodingBatcher")
+        self.thread.daemon = True
+        self.thread.start()
+
+    # Encode the faces at the given boxes of the RGB image. Blocks until the batch with the faces was encoded.
+    def encode(self, image, face_locations) -> list:
+        if len(face_locations) == 0:
+            return []
+
+        request = EncodingRequest(image, face_locations)
+        with self.condition:
+            self.pending.append(request)
+            self.condition.notify()
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+
+        return request.encodings
+
+    def __pending_faces(self) -> int:
+        return sum(len(request.face_locations) for request in self.pending)
+
+    def __is_full(self) -> bool:
+        return self.__pending_faces() >= self.batch_size or len(self.pending) >= self.producers
+
+    # Wait for the next batch. Frames are never split, so a batch might hold more than batch_size faces.
+    def __next_batch(self) -> list[EncodingRequest]:
+        with self.condition:
+            while len(self.pending) == 0:
+                self.condition.wait()
+
+            deadline = self.pending[0].time + self.max_wait
+            while not self.__is_full():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = []
+            faces = 0
+            while len(self.pending) > 0:
+                amount = len(self.pending[0].face_locations)
+                if len(batch) > 0 and faces + amount > self.batch_size:
+                    break
+
+                batch.append(self.pending.pop(0))
+                faces += amount
+
+            return batch
+
+    def __work(self):
+        while True:
+            batch = self.__next_batch()
+            faces = sum(len(request.face_locations) for request in batch)
+
+            self.metrics.observe("encode_batch_wait", time.perf_counter() - batch[0].time)
+            self.metrics.increment("encode_batches")
+            self.metrics.increment("encode_batch_faces", faces)
+            self.metrics.set_gauge("encode_batch_size", faces)
+            self.metrics.set_gauge("encode_batch_frames", len(batch))
+
+            try:
+                with self.metrics.time("encode_batch"):
+                    encodings = self.detector.encode_batch([request.image for request in batch],
+                                                           [request.face_locations for request in batch])
+                for request, request_encodings in zip(batch, encodings):
+                    request.encodings = request_encodings
+            except Exception as e:
+                logging.exception(f"Failed to encode batch of {faces} faces: {e}")
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
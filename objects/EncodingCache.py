@@ -0,0 +1,125 @@
+import json
+import logging
+import os.path
+import zlib
+
+import numpy as np
+
+from objects.FaceGallery import FaceGallery
+
+
+# Persists face encodings of the authorized images, keyed by file name, size and modification time.
+class EncodingCache:
+    format_version: int = 1
+
+    cache_path: str
+    model: str
+
+    # File name -> (size, mtime in ns, encoding).
+    entries: dict[str, tuple[int, int, np.ndarray]]
+    changed: bool = False
+
+    def __init__(self, cache_path: str, model: str = "hog"):
+        self.cache_path = cache_path
+        self.model = model
+        self.entries = {}
+
+    def index_file(self):
+        return os.path.join(self.cache_path, "encodings.json")
+
+    def encodings_file(self):
+        return os.path.join(self.cache_path, "encodings.npy")
+
+    def load(self):
+        self.entries = {}
+        self.changed = False
+
+        if not os.path.isfile(self.index_file()) or not os.path.isfile(self.encodings_file()):
+            return False
+
+        try:
+            with open(self.index_file(), "r") as file:
+                index = json.load(file)
+
+            if index.get("version") != self.format_version or index.get("model") != self.model:
+                logging.info("Encoding cache was created with other settings. Ignoring it.")
+                return False
+
+            encodings = np.load(self.encodings_file(), mmap_mode="r")
+            files = index["files"]
+            if encodings.ndim != 2 or len(encodings) != len(files) or \
+                    zlib.crc32(encodings.tobytes()) != index.get("checksum"):
+                logging.warning("Encoding cache is inconsistent. Ignoring it.")
+                return False
+
+            for row, (file_name, size, mtime) in enumerate(files):
+                self.entries[file_name] = (size, mtime, np.array(encodings[row]))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Failed to load encoding cache: {e}")
+            self.entries = {}
+            return False
+
+        return True
+
+    def save(self):
+        if not self.changed:
+            return True
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        files = []
+        encodings = []
+        for file_name, (size, mtime, encoding) in self.entries.items():
+            files.append([file_name, size, mtime])
+            encodings.append(encoding)
+
+        array = np.array(encodings, dtype=np.float64).reshape(len(encodings), FaceGallery.encoding_size)
+        index = {
+            "version": self.format_version,
+            "model": self.model,
+            "checksum": zlib.crc32(array.tobytes()),
+            "files": files
+        }
+
+        # Write to temporary files first, so a crash never leaves a half-written cache behind.
+        try:
+            with open(self.encodings_file() + ".tmp", "wb") as file:
+                np.save(file, array)
+            with open(self.index_file() + ".tmp", "w") as file:
+                json.dump(index, file)
+
+            os.replace(self.encodings_file() + ".tmp", self.encodings_file())
+            os.replace(self.index_file() + ".tmp", self.index_file())
+        except OSError as e:
+            logging.warning(f"Failed to save encoding cache: {e}")
+            return False
+
+        self.changed = False
+        return True
+
+    # Get the cached encoding of a file, if the file did not change since.
+    def get(self, file_name: str, stat: os.stat_result):
+        entry = self.entries.get(file_name)
+        if entry is None:
+            return None
+
+        size, mtime, encoding = entry
+        if size != stat.st_size or mtime != stat.st_mtime_ns:
+            return None
+
+        return encoding
+
+    def put(self, file_name: str, stat: os.stat_result, encoding):
+        self.entries[file_name] = (stat.st_size, stat.st_mtime_ns, np.asarray(encoding, dtype=np.float64))
+        self.changed = True
+
+    def remove(self, file_name: str):
+        if self.entries.pop(file_name, None) is not None:
+            self.changed = True
+
+    # Drop all entries of files that do not exist anymore.
+    def retain(self, file_names):
+        file_names = set(file_names)
+        for file_name in list(self.entries):
+            if file_name not in file_names:
+                self.remove(file_name)
@@ -0,0 +1,171 @@
+import numpy as np
+
+from objects.AuthorizedPerson import AuthorizedPerson
+from objects.IvfIndex import IvfIndex, squared_distances
+
+
+# Snapshot of all authorized persons with their encodings in one contiguous (N x 128) array.
+# Images of the same name belong to one identity. Faces are matched against templates of the identities:
+#  all      - every image is a template, the closest image decides.
+#  centroid - the mean encoding of the images of an identity.
+#  medoid   - the image of an identity, that is closest to its other images.
+class FaceGallery:
+    encoding_size: int = 128
+    template_modes: tuple = ("all", "centroid", "medoid")
+
+    persons: tuple[AuthorizedPerson, ...]
+    encodings: np.ndarray
+
+    # Names of the identities in the order of their first image, and the identity of every image.
+    names: tuple[str, ...]
+    person_identities: np.ndarray
+
+    template_mode: str
+    templates: np.ndarray
+    squared_norms: np.ndarray
+    # Identity of every template.
+    template_identities: np.ndarray
+
+    # Tolerance of every identity, NaN for the default tolerance.
+    tolerances: np.ndarray
+    # Lower case name -> tolerance
+    person_tolerances: dict
+
+    # Optional approximate index over the templates. Without it, every face is compared with all templates.
+    index: IvfIndex = None
+
+    def __init__(self, persons: list[AuthorizedPerson] = (), encodings: np.ndarray = None, index: IvfIndex = None,
+                 template_mode: str = "all", person_tolerances: dict = None):
+        self.persons = tuple(persons)
+        self.index = index
+        self.template_mode = template_mode if template_mode in self.template_modes else "all"
+        self.person_tolerances = person_tolerances if person_tolerances is not None else {}
+
+        if encodings is None:
+            encodings = np.zeros((len(self.persons), self.encoding_size), dtype=np.float32)
+            for i, person in enumerate(self.persons):
+                encodings[i] = person.encoded_face
+
+        self.encodings = encodings
+        self.encodings.setflags(write=False)
+
+        identities = {}
+        for person in self.persons:
+            identities.setdefault(person.name, len(identities))
+
+        self.names = tuple(identities)
+        self.person_identities = np.array([identities[person.name] for person in self.persons], dtype=np.intp)
+        self.tolerances = np.array([self.person_tolerances.get(name.lower(), np.nan) for name in self.names],
+                                   dtype=np.float32)
+
+        self.templates, self.template_identities = self.__build_templates()
+
+        # Precompute |b|^2 of every template for the distance matrix.
+        self.squared_norms = np.einsum("ij,ij->i", self.templates, self.templates)
+
+        self.templates.setflags(write=False)
+        self.squared_norms.setflags(write=False)
+
+    def __build_templates(self):
+        if self.template_mode == "all" or len(self.persons) == 0:
+            return self.encodings, self.person_identities
+
+        amount = len(self.names)
+        if self.template_mode == "centroid":
+            sums = np.zeros((amount, self.encoding_size), dtype=np.float32)
+            np.add.at(sums, self.person_identities, self.encodings)
+            counts = np.bincount(self.person_identities, minlength=amount)
+            return (sums / counts[:, np.newaxis]).astype(np.float32), np.arange(amount)
+
+        # The medoid has the smallest sum of distances to the other images of its identity.
+        templates = np.empty((amount, self.encoding_size), dtype=np.float32)
+        for identity in range(amount):
+            encodings = self.encodings[self.person_identities == identity]
+            norms = np.einsum("ij,ij->i", encodings, encodings)
+            distances = np.sqrt(squared_distances(encodings, encodings, norms))
+            templates[identity] = encodings[np.argmin(distances.sum(axis=1))]
+
+        return templates, np.arange(amount)
+
+    def __len__(self):
+        return len(self.persons)
+
+    def __create(self, persons, encodings: np.ndarray, index: IvfIndex):
+        return FaceGallery(persons, encodings, index, self.template_mode, self.person_tolerances)
+
+    # Identities are numbered in the order of their first image and their templates move with their images.
+    # So the clusters of the index are kept, but every template of the changed gallery is assigned again.
+    def __create_with_templates(self, persons, encodings: np.ndarray):
+        gallery = self.__create(persons, encodings, None)
+        if self.index is not None:
+            gallery.index = self.index.with_encodings(gallery.templates)
+
+        return gallery
+
+    # Create a new gallery with an additional person. The current gallery stays untouched.
+    def with_person(self, person: AuthorizedPerson):
+        encoding = np.asarray(person.encoded_face, dtype=np.float32).reshape(1, self.encoding_size)
+        persons = self.persons + (person,)
+        encodings = np.concatenate((self.encodings, encoding))
+
+        if self.index is None or self.template_mode != "all":
+            return self.__create_with_templates(persons, encodings)
+
+        return self.__create(persons, encodings, self.index.with_row(encoding, len(self.persons)))
+
+    # Create a new gallery without the person of the given image file. The current gallery stays untouched.
+    def without_file(self, file_name: str):
+        keep = [i for i, person in enumerate(self.persons) if person.file_name != file_name]
+        if len(keep) == len(self.persons):
+            return self
+
+        persons = [self.persons[i] for i in keep]
+        if self.index is None or self.template_mode != "all":
+            return self.__create_with_templates(persons, self.encodings[keep])
+
+        removed = [i for i, person in enumerate(self.persons) if person.file_name == file_name]
+        return self.__create(persons, self.encodings[keep], self.index.without_rows(removed))
+
+    # Create a new gallery with a freshly trained index, or without one if probes is 0.
+    def with_index(self, probes: int):
+        index = IvfIndex.build(self.templates, probes) if probes > 0 and len(self.persons) > 0 else None
+        return self.__create(self.persons, self.encodings, index)
+
+    # Tolerance of the identity, or the default if it has none.
+    def tolerance(self, identity: int, default: float) -> float:
+        tolerance = self.tolerances[identity]
+        return default if np.isnan(tolerance) else float(tolerance)
+
+    # Compare every face against the templates of all identities in one batch.
+    # Returns the index of the best matching identity (see names) and its distance for each face.
+    def match(self, face_encodings):
+        amount = len(face_encodings)
+        if amount == 0 or len(self.persons) == 0:
+            return np.full(amount, -1, dtype=np.intp), np.full(amount, np.inf, dtype=np.float32)
+
+        faces = np.asarray(face_encodings, dtype=np.float32).reshape(amount, self.encoding_size)
+
+        if self.index is not None:
+            best_matches, best_distances = self.index.search(faces, self.templates, self.squared_norms)
+
+            # Compare faces without any template in their closest clusters with everyone.
+            missed = best_matches < 0
+            if np.any(missed):
+                best_matches[missed], best_distances[missed] = self.__match_all(faces[missed])
+
+        else:
+            best_matches, best_distances = self.__match_all(faces)
+
+        # The closest template decides about the identity.
+        return self.template_identities[best_matches], best_distances
+
+    def __match_all(self, faces):
+        amount = len(faces)
+
+        # |a - b|^2 = |a|^2 + |b|^2 - 2ab for all pairs at once.
+        distances = squared_distances(faces, self.templates, self.squared_norms)
+
+        best_matches = np.argmin(distances, axis=1)
+        best_distances = np.sqrt(distances[np.arange(amount), best_matches])
+
+        return best_matches, best_distances
@@ -1,75 +1,233 @@
 import logging
+import multiprocessing
 import os.path
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
 
 import cv2
 
 from objects.AuthorizedPerson import AuthorizedPerson
-from objects.util.faceutils import find_faces
+from objects.EncodingCache import EncodingCache
+from objects.FaceGallery import FaceGallery
+from objects.HistoryEvent import HistoryEvent
+from objects.HistoryStore import HistoryStore
+from objects.HistorySweeper import HistorySweeper
+from objects.HistoryWriter import HistoryWriter
+from objects.util.faceutils import encode_image_file
 from objects.util.fileutils import list_files, delete_file, get_file
+from objects.util.imageutils import image_extension, image_write_params, thumbnail
 from objects.util.timeutils import datetime_to_string
 
 
 class FaceHandler:
     image_path: str = os.path.join("data", "images")
     history_path: str = os.path.join("data", "history")
+    cache_path: str = os.path.join("data", "cache")
+    # Retention of the history, 0 disables a limit.
     max_history_images = 100
+    # Total size (in bytes) of all history images and thumbnails.
+    max_history_bytes: int = 0
+    # Age (in days) after which history images are deleted.
+    max_history_age: float = 0
+    max_history_images_per_person: int = 0
 
-    # List of all authorized persons and their faces.
-    authorized_persons: list[AuthorizedPerson] = []
-    encoded_faces = []
+    # Format (png, jpeg or webp) and quality (0-100) of history images.
+    history_format: str = "png"
+    history_quality: int = 90
+    # Width (in px) of the thumbnails of history images, 0 to not create any.
+    thumbnail_width: int = 0
+
+    # Writes history images in the background. Without it, they are written by the caller.
+    history_writer: HistoryWriter = None
+
+    # Index of the history images, opened on first use.
+    history_store: HistoryStore = None
+
+    # Cleans up the history periodically. Without it, the history is cleaned up after every saved image.
+    history_sweeper: HistorySweeper = None
+
+    # Immutable snapshot of all authorized persons and their faces.
+    # Changes build a new snapshot and swap it in, so readers never see a partial whitelist.
+    gallery: FaceGallery = FaceGallery()
+
+    # Encodings of unchanged images are reused instead of running the detection again.
+    encoding_cache: EncodingCache = None
+
+    # Number of processes used to encode new images at startup.
+    loader_workers: int = 0
+
+    # Templates the faces are matched against (all, centroid or medoid) and tolerances of single persons.
+    template_mode: str = "all"
+    person_tolerances: dict = {}
+
+    # Clusters searched by the approximate index of the gallery, 0 to always compare with every person.
+    index_probes: int = 0
+    # Smaller galleries are compared with every person, which is fast enough and exact.
+    index_min_size: int = 1000
+    # The index is trained again, after the gallery grew or shrank by this factor.
+    index_retrain_factor: float = 4.0
+
+    def __init__(self, loader_workers: int = 0):
+        self.loader_workers = loader_workers
+
+        # Serializes changes to the gallery and the cache.
+        self.lock = Lock()
+        self.history_lock = Lock()
+        self.history_file_lock = Lock()
+
+    # Add, drop or retrain the index of the gallery, depending on its size.
+    def __indexed(self, gallery: FaceGallery) -> FaceGallery:
+        if self.index_probes <= 0 or len(gallery) < self.index_min_size:
+            return gallery.with_index(0) if gallery.index is not None else gallery
+
+        index = gallery.index
+        if index is None or not (index.trained_size / self.index_retrain_factor <= len(gallery) <=
+                                 index.trained_size * self.index_retrain_factor):
+            logging.info(f"Training the index of {len(gallery)} authorized faces.")
+            return gallery.with_index(self.index_probes)
+
+        return gallery
+
+    @property
+    def authorized_persons(self):
+        return self.gallery.persons
+
+    @property
+    def thumbnail_path(self):
+        return os.path.join(self.history_path, "thumbnails")
 
     def setup_folders(self):
         os.makedirs(self.history_path, exist_ok=True)
+        os.makedirs(self.thumbnail_path, exist_ok=True)
         os.makedirs(self.image_path, exist_ok=True)
+        os.makedirs(self.cache_path, exist_ok=True)
 
     def load_images(self):
         self.setup_folders()
-        path = self.image_path
-
-        # Clear current authorized faces
-        self.authorized_persons.clear()
-        self.encoded_faces.clear()
-
-        # Loop through every file in the folder.
-        for file in list_files(path):
-            file_path = os.path.join(path, file)
-
-            if " " in file:
-                logging.warning(f"Cannot load image with white-spaces: {file}")
-                continue
-
-            image = cv2.imread(file_path)
-            if image is None:
-                logging.warning(f"Failed to read image file: {file}")
-                continue
-
-            # Get faces out of the image.
-            face_locations, encoded_faces, amount = find_faces(image)
-
-            # Handle amount of faces in the image.
-            if amount == 1:
-                # Get name of the person by filename.
-                name = file.split(".")[0].split("_")[0]
-
-                # Add person to the whitelist.
-                authorized_person = AuthorizedPerson(name, file, file_path, image, encoded_faces[0])
-                self.authorized_persons.append(authorized_person)
-                self.encoded_faces.append(encoded_faces[0])
-            else:
-                logging.warning(f"{amount} faces found in image {file} - Deleting...")
-                os.remove(file_path)
-                continue
+
+        with self.lock:
+            self.__load_cache()
+
+            encoded_faces = {}
+            stats = {}
+            to_encode = []
+
+            # Loop through every file in the folder and reuse the encodings of unchanged images.
+            files = list_files(self.image_path)
+            for file in files:
+                if " " in file:
+                    logging.warning(f"Cannot load image with white-spaces: {file}")
+                    continue
+
+                stats[file] = os.stat(os.path.join(self.image_path, file))
+                encoded_face = self.encoding_cache.get(file, stats[file])
+                if encoded_face is None:
+                    to_encode.append(file)
+                else:
+                    encoded_faces[file] = encoded_face
+
+            cached_amount = len(encoded_faces)
+
+            # Encode new or changed images.
+            for file, (encoded_face, amount) in zip(to_encode, self.__encode_files(to_encode)):
+                if self.__check_encoding(file, amount):
+                    encoded_faces[file] = encoded_face
+                    self.encoding_cache.put(file, stats[file], encoded_face)
+
+            # Add persons to the whitelist, in the order of the files.
+            authorized_persons = [self.__create_person(file, encoded_faces[file])
+                                  for file in files if file in encoded_faces]
+
+            # Forget removed images and persist the changes.
+            self.encoding_cache.retain(files)
+            self.encoding_cache.save()
+
+            self.gallery = self.__indexed(FaceGallery(authorized_persons, template_mode=self.template_mode,
+                                                      person_tolerances=self.person_tolerances))
+
+        logging.info(f"Encoded {len(to_encode)} new or changed images, reused {cached_amount} cached encodings.")
 
         # Print authorized persons.
         # Check how many persons are authorized.
-        amount = len(self.authorized_persons)
-        logging.info(f"Found {amount} authorized persons" + (":" if amount > 0 else "."))
+        amount = len(authorized_persons)
+        logging.info(f"Found {amount} images of {len(self.gallery.names)} authorized persons" +
+                     (":" if amount > 0 else "."))
 
         # Loop through every person to print information about them.
-        for authorized_person in self.authorized_persons:
+        for authorized_person in authorized_persons:
             logging.info(" - " + authorized_person.name + ": " + authorized_person.file_path)
 
+    # Load the cache once, afterwards it is kept up to date in memory.
+    def __load_cache(self):
+        if self.encoding_cache is None:
+            self.encoding_cache = EncodingCache(self.cache_path)
+            self.encoding_cache.load()
+
+    # Encode the given files, in parallel if enabled. Results are returned in the order of the files.
+    def __encode_files(self, files: list[str]):
+        file_paths = [os.path.join(self.image_path, file) for file in files]
+        total = len(file_paths)
+        workers = min(self.loader_workers, total)
+
+        # Forked workers share the loaded models with this process. Other start methods would re-run main.py.
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            logging.info(f"Encoding {total} images with {workers} processes...")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+                return self.__collect_encodings(executor.map(encode_image_file, file_paths), total)
+
+        if workers > 1:
+            logging.warning("Parallel encoding is not supported on this platform. Encoding one after another.")
+
+        return self.__collect_encodings(map(encode_image_file, file_paths), total)
+
+    @staticmethod
+    def __collect_encodings(results, total: int):
+        collected = []
+        step = max(1, total // 10)
+
+        for result in results:
+            collected.append(result)
+            if len(collected) % step == 0 or len(collected) == total:
+                logging.info(f"Encoded {len(collected)}/{total} images.")
+
+        return collected
+
+    # Check the amount of faces found in an image and delete it, if it cannot be used.
+    def __check_encoding(self, file: str, amount) -> bool:
+        if amount is None:
+            logging.warning(f"Failed to read image file: {file}")
+            return False
+
+        if amount != 1:
+            logging.warning(f"{amount} faces found in image {file} - Deleting...")
+            os.remove(os.path.join(self.image_path, file))
+            return False
+
+        return True
+
+    def __create_person(self, file: str, encoded_face):
+        # Get name of the person by filename.
+        name = file.split(".")[0].split("_")[0]
+        return AuthorizedPerson(name, file, os.path.join(self.image_path, file), encoded_face)
+
+    # Load a single authorized image. The image is only encoded, if no encoding is passed in.
+    def __load_person(self, file: str, encoded_face=None):
+        if " " in file:
+            logging.warning(f"Cannot load image with white-spaces: {file}")
+            return None
+
+        file_path = os.path.join(self.image_path, file)
+        stat = os.stat(file_path)
+
+        if encoded_face is None:
+            encoded_face, amount = encode_image_file(file_path)
+            if not self.__check_encoding(file, amount):
+                return None
+
+        self.encoding_cache.put(file, stat, encoded_face)
+        return self.__create_person(file, encoded_face)
+
     def get_authorized_person_image_file(self, file: str):
         return get_file(self.image_path, file)
 
@@ -80,6 +238,9 @@ class FaceHandler:
     def get_authorized_image_files(self):
         return list_files(self.image_path)
 
+    def get_history_thumbnail_file(self, file: str):
+        return get_file(self.thumbnail_path, file)
+
     # Get authorized image files
     def get_history_image_files(self):
         return list_files(self.history_path)
@@ -94,12 +255,17 @@ class FaceHandler:
         result = delete_file(file)
 
         if reload:
-            self.load_images()
+            with self.lock:
+                self.gallery = self.__indexed(self.gallery.without_file(image_name))
+
+                if self.encoding_cache is not None:
+                    self.encoding_cache.remove(image_name)
+                    self.encoding_cache.save()
 
         return result
 
-    # Save frame.
-    def create_authorized_person(self, image, name: str, reload: bool = True) -> bool:
+    # Save frame. The encoding can be passed in, if the face was already encoded by the caller.
+    def create_authorized_person(self, image, name: str, reload: bool = True, encoded_face=None) -> bool:
         self.setup_folders()
 
         dt_string = datetime_to_string(datetime.now())
@@ -112,49 +278,120 @@ class FaceHandler:
         logging.info("Successfully added image of authorized person." if result else
                      "Could not save the image of the authorized person.")
 
-        if reload:
-            self.load_images()
+        if result and reload:
+            with self.lock:
+                self.__load_cache()
+
+                authorized_person = self.__load_person(file_name, encoded_face)
+                if authorized_person is None:
+                    return False
+
+                self.gallery = self.__indexed(self.gallery.without_file(file_name).with_person(authorized_person))
+                self.encoding_cache.save()
 
         return result
 
+    def get_history_store(self) -> HistoryStore:
+        with self.history_lock:
+            if self.history_store is None:
+                self.setup_folders()
+                self.history_store = HistoryStore(os.path.join(self.cache_path, "history.sqlite"))
+
+                # Index the images of older versions.
+                if self.history_store.count == 0:
+                    files = self.get_history_image_files()
+                    thumbnails = set(list_files(self.thumbnail_path))
+                    sizes = {file: self.__history_file_size(file, file in thumbnails) for file in files}
+                    self.history_store.import_files(files, thumbnails, sizes)
+
+            return self.history_store
+
+    # Newest history events first and the amount of all events matching the filters.
+    def get_history(self, limit: int = 100, offset: int = 0, person: str = None, start: datetime = None,
+                    end: datetime = None):
+        return self.get_history_store().query(limit, offset, person, start, end)
+
     def delete_history_image(self, file_name: str) -> bool:
         self.setup_folders()
 
+        self.get_history_store().remove(file_name)
+        return self.__delete_history_files(file_name)
+
+    def __history_file_size(self, file_name: str, has_thumbnail: bool) -> int:
+        size = os.path.getsize(os.path.join(self.history_path, file_name))
+        if has_thumbnail:
+            size += os.path.getsize(os.path.join(self.thumbnail_path, file_name))
+
+        return size
+
+    def __delete_history_files(self, file_name: str) -> bool:
+        thumbnail_file = self.get_history_thumbnail_file(file_name)
+        if thumbnail_file is not None:
+            delete_file(thumbnail_file)
+
         file = self.get_history_image_file(file_name)
-        return delete_file(file)
+        return file is not None and delete_file(file)
+
+    # Save frame. The frame is handed to the history writer, so it must not be modified afterwards.
+    def save_frame_in_history(self, image, person_name: str, camera: str = "", distance: float = None):
+        if self.history_writer is not None:
+            self.history_writer.submit(image, person_name, datetime.now(), camera, distance)
+        else:
+            self.write_history_image(image, person_name, datetime.now(), camera, distance)
 
-    # Save frame.
-    def save_frame_in_history(self, image, person_name: str):
+    def write_history_image(self, image, person_name: str, time: datetime, camera: str = "",
+                            distance: float = None):
         self.setup_folders()
 
-        dt_string = datetime_to_string(datetime.now())
-        file_name = f"{dt_string}_{person_name}.png"
-        file = os.path.join(self.history_path, file_name)
+        # Pick a free name and write it right away, so no other thread takes the same name.
+        with self.history_file_lock:
+            counter = 1
+            while True:
+                file_name = HistoryEvent.to_file_name(time, person_name, camera, image_extension(self.history_format),
+                                                      counter)
+                file = os.path.join(self.history_path, file_name)
+                if not os.path.exists(file):
+                    break
+                counter += 1
 
-        result = cv2.imwrite(file, image)
+            result = cv2.imwrite(file, image, image_write_params(self.history_format, self.history_quality))
 
         # Log message.
         logging.info("Successfully saved image of authorized person." if result else
                      "Could not save the image of the authorized person.")
+        if not result:
+            return
 
-        self.cleanup_history()
+        has_thumbnail = False
+        if self.thumbnail_width > 0:
+            has_thumbnail = cv2.imwrite(os.path.join(self.thumbnail_path, file_name),
+                                        thumbnail(image, self.thumbnail_width),
+                                        image_write_params(self.history_format, self.history_quality))
 
-    # Handle a maximum amount of images stored on the disk.
-    def cleanup_history(self):
-        self.setup_folders()
+        self.get_history_store().add(HistoryEvent(time, person_name, distance, camera, file_name, has_thumbnail,
+                                                  self.__history_file_size(file_name, has_thumbnail)))
 
-        image_files = self.get_history_image_files()
-        amount = len(image_files)
-        if amount <= self.max_history_images:
-            return
+        if self.history_sweeper is None:
+            self.cleanup_history()
+
+    # Enforce the retention of the history. The oldest images are deleted first. Returns the amount of deleted images.
+    def cleanup_history(self) -> int:
+        history_store = self.get_history_store()
+
+        files = []
+        if self.max_history_age > 0:
+            files += history_store.remove_before(datetime.now() - timedelta(days=self.max_history_age))
+        if self.max_history_images_per_person > 0:
+            files += history_store.remove_over_quota(self.max_history_images_per_person)
+        if self.max_history_images > 0:
+            files += history_store.remove_oldest(history_store.count - self.max_history_images)
+        if self.max_history_bytes > 0:
+            files += history_store.remove_oversized(self.max_history_bytes)
 
-        to_delete = amount - self.max_history_images
-        deleted = 0
+        for file_name in files:
+            self.__delete_history_files(file_name)
 
-        for file_name in image_files:
-            if deleted >= to_delete:
-                break
+        if len(files) > 0:
+            logging.info(f"Deleted {len(files)} old history images.")
 
-            self.delete_history_image(file_name)
-            logging.info("Deleted old history image: " + file_name)
-            deleted += 1
+        return len(files)
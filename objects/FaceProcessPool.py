@@ -0,0 +1,207 @@
+import atexit
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Condition
+
+import cv2
+import numpy as np
+
+from objects.Config import Config
+from objects.detector.FaceDetector import FaceDetector
+from objects.util.detectorutils import create_detector
+from objects.util.faceutils import locate_faces, encode_faces
+
+# Detector of a worker process, created once when the process starts.
+worker_detector = None
+
+
+def init_worker(config: Config):
+    global worker_detector
+    worker_detector = create_detector(config)
+
+
+# The slots belong to the main process, which unlinks them. Attaching must not register them with the resource
+# tracker, otherwise it warns about leaked memory or unlinks slots, that are still in use, when a worker exits.
+def attach_shared_memory(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name, track=False)
+
+    # Older versions always register, so the slot is unregistered right away. There is no public api for this.
+    memory = SharedMemory(name)
+    resource_tracker.unregister(memory._name, "shared_memory")
+    return memory
+
+
+# Copy an RGB frame out of shared memory.
+def read_shared_frame(name: str, shape: tuple, dtype: str):
+    memory = attach_shared_memory(name)
+    try:
+        frame_rgb = np.array(np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+    finally:
+        memory.close()
+
+    return frame_rgb
+
+
+# Worker functions return their result and the time (in s) the detector took, so the main process can record it.
+def locate_shared_faces(name: str, shape: tuple, dtype: str, detection_scale: float, regions):
+    frame_rgb = read_shared_frame(name, shape, dtype)
+    start = time.perf_counter()
+    return locate_faces(frame_rgb, detection_scale, regions, worker_detector), time.perf_counter() - start
+
+
+def encode_shared_faces(name: str, shape: tuple, dtype: str, face_locations):
+    frame_rgb = read_shared_frame(name, shape, dtype)
+    start = time.perf_counter()
+    return encode_faces(frame_rgb, face_locations, worker_detector), time.perf_counter() - start
+
+
+def warm_up():
+    return True
+
+
+# RGB frame in a slot of shared memory, so the workers can read it without pickling it.
+class SharedFrame:
+    def __init__(self, pool, memory: SharedMemory, shape: tuple, dtype: str):
+        self.pool = pool
+        self.memory = memory
+        self.shape = shape
+        self.dtype = dtype
+
+    def locate(self, detection_scale: float, regions):
+        return self.pool.run("detect", self.memory, locate_shared_faces, self.shape, self.dtype, detection_scale,
+                             regions)
+
+    def encode(self, face_locations):
+        if len(face_locations) == 0:
+            return []
+
+        return self.pool.run("encode", self.memory, encode_shared_faces, self.shape, self.dtype, face_locations)
+
+    def close(self):
+        self.pool.release(self.memory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Runs the face detection and encoding in worker processes, outside the GIL of the recognition threads.
+# Frames are handed over in shared memory, only the small results are sent back.
+class FaceProcessPool:
+    # Maximum time (in s) to wait for a worker.
+    timeout: float = 30.0
+    # Statistics of the workers are added to this detector.
+    detector: FaceDetector = None
+    # Set after a worker died, e.g. killed because the memory ran out, or did not answer in time.
+    # The pool is not used afterwards.
+    broken: bool = False
+
+    def __init__(self, config: Config, workers: int, detector: FaceDetector = None):
+        self.detector = detector
+
+        # Forked workers share the loaded models and do not re-run main.py.
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                            initializer=init_worker, initargs=(config,))
+
+        # Two slots per worker, so the next frame can be copied while a worker is busy.
+        self.slot_amount = workers * 2
+        self.slots: list[SharedMemory] = []
+        self.free_slots: list[SharedMemory] = []
+        # Slots of tasks, that did not finish in time. They are only unlinked, when the pool is closed.
+        self.abandoned_slots: list[SharedMemory] = []
+        self.condition = Condition()
+
+        # Forking with other threads running is unsafe, so all workers are started right now.
+        self.executor.submit(warm_up).result()
+        logging.info(f"Started {workers} face recognition processes.")
+
+        atexit.register(self.close)
+
+    # Run a worker function on the frame in the slot and record the time its detector took.
+    def run(self, stage: str, memory: SharedMemory, function, *args):
+        future = None
+        try:
+            future = self.executor.submit(function, memory.name, *args)
+            result, seconds = future.result(self.timeout)
+        except BrokenProcessPool:
+            self.__break("A face recognition process died")
+            raise
+        except FutureTimeoutError:
+            # A running task can not be cancelled and its worker might still read the slot.
+            if not future.cancel():
+                self.__abandon(memory)
+            self.__break("A face recognition process did not answer in time")
+            raise
+
+        if self.detector is not None:
+            self.detector.record(stage, seconds)
+
+        return result
+
+    @staticmethod
+    def is_supported():
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    # Convert the BGR frame to RGB into a free slot. Blocks while all slots are in use.
+    def share(self, frame) -> SharedFrame:
+        with self.condition:
+            while len(self.free_slots) == 0 and len(self.slots) >= self.slot_amount:
+                self.condition.wait()
+
+            memory = self.free_slots.pop() if len(self.free_slots) > 0 else None
+
+            # Replace slots that are too small, e.g. after the resolution of the camera changed.
+            if memory is not None and memory.size < frame.nbytes:
+                self.slots.remove(memory)
+                self.__destroy(memory)
+                memory = None
+
+            if memory is None:
+                memory = SharedMemory(create=True, size=frame.nbytes)
+                self.slots.append(memory)
+
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=np.ndarray(frame.shape, dtype=frame.dtype, buffer=memory.buf))
+        return SharedFrame(self, memory, frame.shape, frame.dtype.str)
+
+    def release(self, memory: SharedMemory):
+        with self.condition:
+            if memory in self.slots:
+                self.free_slots.append(memory)
+            self.condition.notify()
+
+    # Never hand out the slot again, a new one is created in its place.
+    def __abandon(self, memory: SharedMemory):
+        with self.condition:
+            self.slots.remove(memory)
+            self.abandoned_slots.append(memory)
+            self.condition.notify()
+
+    def __break(self, reason: str):
+        if not self.broken:
+            logging.error(f"{reason}, detecting faces in threads instead.")
+        self.broken = True
+
+    @staticmethod
+    def __destroy(memory: SharedMemory):
+        memory.close()
+        memory.unlink()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        with self.condition:
+            for memory in self.slots + self.abandoned_slots:
+                self.__destroy(memory)
+
+            self.slots.clear()
+            self.free_slots.clear()
+            self.abandoned_slots.clear()
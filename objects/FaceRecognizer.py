@@ -1,110 +1,256 @@
 import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from threading import Thread
 
 import cv2
-import face_recognition
 
 from objects import Config, Camera, RaspberryPi, FaceHandler
+from objects.EncodingBatcher import EncodingBatcher
+from objects.FaceProcessPool import FaceProcessPool
+from objects.FaceTracker import FaceTracker
+from objects.Metrics import Metrics
+from objects.MotionDetector import MotionDetector
+from objects.TemporalVote import TemporalVote
 from objects.Timer import Timer
-from objects.util.faceutils import find_faces, frame_face
+from objects.detector.FaceDetector import FaceDetector
+from objects.detector.HogDetector import HogDetector
+from objects.util.faceutils import locate_faces, encode_faces, frame_face
 
 
 class FaceRecognizer:
-    last_frame = None
+    # Sequence number of the last analyzed camera frame.
+    last_sequence: int = 0
 
     config: Config
     camera: Camera
     pi: RaspberryPi
     face_handler: FaceHandler
+    detector: FaceDetector
+    motion_detector: MotionDetector = None
+    tracker: FaceTracker = None
+    vote: TemporalVote = None
+    # Count the votes per track instead of per person.
+    vote_by_track: bool = False
+    face_pool: FaceProcessPool = None
+    # Encodes the faces together with those of other frames, if set.
+    encoder: EncodingBatcher = None
+    metrics: Metrics
 
-    def __init__(self, config: Config, camera: Camera, pi: RaspberryPi, face_handler: FaceHandler):
+    def __init__(self, config: Config, camera: Camera, pi: RaspberryPi, face_handler: FaceHandler,
+                 detector: FaceDetector = None, metrics: Metrics = None, start: bool = True,
+                 face_pool: FaceProcessPool = None, encoder: EncodingBatcher = None):
         self.config = config
         self.camera = camera
         self.pi = pi
         self.face_handler = face_handler
+        self.detector = detector if detector is not None else HogDetector()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.labels = {"camera": camera.name}
+        self.face_pool = face_pool
+        self.encoder = encoder
 
-        self.thread = Thread(target=self.__check_image)
-        self.thread.daemon = True
-        self.thread.start()
+        if config.motion_detection_enabled():
+            self.motion_detector = MotionDetector(config.motion_detection_sensitivity(),
+                                                  config.motion_detection_min_changed_area(),
+                                                  config.motion_detection_cooldown())
+
+        if config.tracking_enabled():
+            self.tracker = FaceTracker(config.tracking_min_overlap(), config.tracking_reverify_overlap(),
+                                       config.tracking_reverify_interval(), config.tracking_max_missed_frames())
+
+        if config.decision_vote_enabled():
+            self.vote = TemporalVote(config.decision_vote_frames(), config.decision_vote_required_frames(),
+                                     config.decision_vote_max_mean_distance())
+            self.vote_by_track = self.tracker is not None and config.decision_vote_by().lower() == "track"
+
+        # Without starting the thread, frames have to be passed to process_frame().
+        if start:
+            self.thread = Thread(target=self.__check_image)
+            self.thread.daemon = True
+            self.thread.start()
 
     def __check_image(self):
         while True:
-            frame_bgr = self.camera.read()
-            if frame_bgr is None:
-                continue
-            if self.last_frame is not None and (self.last_frame == frame_bgr).all():
+            # Wait for a frame that was not analyzed yet.
+            with self.metrics.time("wait", self.labels):
+                self.last_sequence, borrowed = self.camera.wait_for_frame(self.last_sequence)
+            if borrowed is None:
                 continue
 
-            self.last_frame = frame_bgr
+            with borrowed:
+                self.process_frame(borrowed.frame)
+
+        self.camera.disconnect()
+        self.pi.switch_gpio(False)
+
+    def __vote_key(self, track, name: str):
+        return track.track_id if self.vote_by_track else name
+
+    # Search for authorized persons in a frame and toggle the gpio. Returns the amount of faces found.
+    def process_frame(self, frame_bgr) -> int:
+        with self.metrics.time("total", self.labels):
+            return self.__process_frame(frame_bgr)
+
+    def __process_frame(self, frame_bgr) -> int:
+        self.metrics.increment("frames", labels=self.labels)
+
+        # Skip the detection, if nothing moved.
+        if self.motion_detector is not None:
+            with self.metrics.time("motion", self.labels):
+                motion = self.motion_detector.has_motion(frame_bgr)
+            if not motion:
+                self.metrics.increment("frames_without_motion", labels=self.labels)
+                return 0
 
-            # Convert BGR to RGB.
+        # Detect and encode in the worker processes, if there are any.
+        # Forking new workers is unsafe while threads run, so the threads take over, if a worker died or hung.
+        if self.face_pool is not None and not self.face_pool.broken:
+            with self.metrics.time("share", self.labels):
+                shared_frame = self.face_pool.share(frame_bgr)
+
+            try:
+                with shared_frame:
+                    return self.__recognize(frame_bgr, None, shared_frame)
+            except BrokenProcessPool:
+                self.metrics.increment("process_pool_failures", labels=self.labels)
+            except FutureTimeoutError:
+                self.metrics.increment("process_pool_timeouts", labels=self.labels)
+
+        # Convert BGR to RGB.
+        with self.metrics.time("convert", self.labels):
             frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-            # Null check
-            if frame_rgb is None:
-                continue
+        # Null check
+        if frame_rgb is None:
+            return 0
 
-            # Get all faces in current frame.
-            face_locations, face_encodings, amount = find_faces(frame_rgb)
+        return self.__recognize(frame_bgr, frame_rgb, None)
 
-            # Var to check if door will be opened by this frame.
-            door_opened_before = self.pi.current_state
+    def __recognize(self, frame_bgr, frame_rgb, shared_frame) -> int:
+        # Get all faces in current frame.
+        with self.metrics.time("detect", self.labels):
+            if shared_frame is not None:
+                face_locations = shared_frame.locate(self.config.face_recognition_detection_scale(),
+                                                     self.config.face_recognition_regions())
+            else:
+                face_locations = locate_faces(frame_rgb, self.config.face_recognition_detection_scale(),
+                                              self.config.face_recognition_regions(), self.detector)
+        amount = len(face_locations)
+        self.metrics.increment("faces", amount, labels=self.labels)
 
-            # Check if any face is authorized.
-            any_authorized_face = False
+        # The camera frame is shared, so only draw on a copy.
+        if amount > 0:
+            frame_bgr = frame_bgr.copy()
 
-            # Get name of authorized person
-            person_name = ""
+        # Var to check if door will be opened by this frame.
+        door_opened_before = self.pi.current_state
 
-            # Copy data to prevent thread problems
-            encoded_faces = self.face_handler.encoded_faces.copy()
-            authorized_persons = self.face_handler.authorized_persons.copy()
+        # Check if any face is authorized.
+        any_authorized_face = False
 
-            # Loop through all the faces found in the current frame.
-            for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-                # Var to check if the person is authorized or not
-                authorized = False
+        # Get name and face distance of authorized person
+        person_name = ""
+        person_distance = None
 
-                # Compare face with the authorized faces.
-                matches = face_recognition.compare_faces(encoded_faces, face_encoding,
-                                                         tolerance=self.config.face_recognition_tolerance())
+        # Take the current snapshot of authorized faces.
+        gallery = self.face_handler.gallery
+        self.metrics.set_gauge("gallery_size", len(gallery))
+        tolerance = self.config.face_recognition_tolerance()
+        unknown_name = self.config.settings_unknown_name()
 
-                # Check if a face matches.
-                for i in range(len(matches)):
-                    # Continue, if it doesn't match 100%.
-                    if not matches[i]:
-                        continue
+        # Follow the faces across frames and only encode those, that were not identified recently.
+        # Authorized faces keep being encoded, until the vote confirmed them.
+        tracks = self.tracker.update(face_locations) if self.tracker is not None else None
+        to_verify = [i for i in range(amount)
+                     if tracks is None or self.tracker.needs_verification(tracks[i], gallery) or
+                     (self.vote is not None and tracks[i].authorized and
+                      not self.vote.is_confirmed(self.__vote_key(tracks[i], tracks[i].name)))]
 
-                    # Get name.
-                    name = authorized_persons[i].name
+        # Compare all new faces of the frame with the authorized faces at once.
+        with self.metrics.time("encode", self.labels):
+            if shared_frame is not None:
+                face_encodings = shared_frame.encode([face_locations[i] for i in to_verify])
+            elif self.encoder is not None:
+                face_encodings = self.encoder.encode(frame_rgb, [face_locations[i] for i in to_verify])
+            else:
+                face_encodings = encode_faces(frame_rgb, [face_locations[i] for i in to_verify], self.detector)
+        self.metrics.increment("encoded_faces", len(face_encodings), labels=self.labels)
+
+        with self.metrics.time("match", self.labels):
+            best_matches, distances = gallery.match(face_encodings)
+
+        names = [unknown_name] * amount
+        authorized = [False] * amount
+        face_distances = [None] * amount
+
+        # Check if the best match is close enough.
+        for i, best_match, distance in zip(to_verify, best_matches, distances):
+            authorized[i] = bool(best_match >= 0 and distance <= gallery.tolerance(best_match, tolerance))
+            face_distances[i] = float(distance)
+            if authorized[i]:
+                names[i] = gallery.names[best_match]
+
+            if tracks is not None:
+                self.tracker.verify(tracks[i], gallery, authorized[i], names[i], float(distance))
+
+        # Carry the identity of the other faces forward.
+        if tracks is not None:
+            for i in range(amount):
+                if i not in to_verify:
+                    authorized[i] = tracks[i].authorized
+                    names[i] = tracks[i].name
+                    face_distances[i] = tracks[i].distance
+
+        # Only open for persons, that matched in enough of the last frames.
+        if self.vote is not None:
+            keys = [self.__vote_key(tracks[i] if tracks is not None else None, names[i]) for i in range(amount)]
+
+            votes = {}
+            for i in range(amount):
+                if authorized[i]:
+                    votes[keys[i]] = min(votes.get(keys[i], face_distances[i]), face_distances[i])
+
+            confirmed = self.vote.add_frame(votes)
+            unconfirmed = [i for i in range(amount) if authorized[i] and keys[i] not in confirmed]
+            self.metrics.increment("unconfirmed_matches", len(unconfirmed), labels=self.labels)
+            for i in unconfirmed:
+                authorized[i] = False
+
+        # Loop through all the faces found in the current frame.
+        with self.metrics.time("draw", self.labels):
+            for (top, right, bottom, left), name, face_authorized, face_distance in zip(face_locations, names,
+                                                                                         authorized, face_distances):
+                if face_authorized:
                     if len(person_name) <= 0:
                         person_name = name
+                        person_distance = face_distance
 
                     # Draw a frame around the face.
                     frame_face(frame_bgr, True, name, left, top, right, bottom)
-                    logging.info(f"Found authorized person: {name}")
+                    logging.info(f"Found authorized person at {self.camera.name}: {name}")
 
-                    # End loop
-                    authorized = True
                     any_authorized_face = True
-
-                # Also frame face, if the person is unknown.
-                if not authorized:
-                    name = self.config.settings_unknown_name()
+                else:
+                    # Also frame face, if the person is unknown.
                     frame_face(frame_bgr, False, name, left, top, right, bottom)
-                    logging.info(f"Person found: {name}")
+                    logging.info(f"Person found at {self.camera.name}: {name}")
 
-            # Check if toggling is allowed
-            if Timer.is_toggling_allowed(self.config.settings_allow_toggle_from(),
-                                         self.config.settings_allow_toggle_to()):
-                # Open or close door
-                if any_authorized_face:
-                    self.pi.switch_gpio(True, self.pi.duration)
+        # Check if toggling is allowed
+        if Timer.is_toggling_allowed(self.config.settings_allow_toggle_from(),
+                                     self.config.settings_allow_toggle_to()):
+            # Open or close door
+            if any_authorized_face:
+                self.pi.switch_gpio(True, self.pi.duration)
 
-                # Save the image, if the door will be opened by this image.
-                if not door_opened_before and self.pi.current_state:
-                    self.face_handler.save_frame_in_history(frame_bgr, person_name)
-
-        self.camera.disconnect()
-        self.pi.switch_gpio(False)
+            # Save the image, if the door will be opened by this image.
+            if not door_opened_before and self.pi.current_state:
+                with self.metrics.time("save", self.labels):
+                    # The door might have been opened by the api, while the frame without faces is not copied yet.
+                    # The history is written later, after the camera reused the buffer.
+                    if amount == 0:
+                        frame_bgr = frame_bgr.copy()
 
+                    self.face_handler.save_frame_in_history(frame_bgr, person_name, self.camera.name,
+                                                            person_distance)
 
+        return amount
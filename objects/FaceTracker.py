@@ -0,0 +1,99 @@
+import time
+
+from objects.util.faceutils import box_iou
+
+
+# A face followed across frames, with the identity of its last verification.
+class Track:
+    track_id: int
+    box: tuple
+    missed_frames: int = 0
+
+    # Result of the last verification.
+    verified: bool = False
+    authorized: bool = False
+    name: str = None
+    distance: float = None
+    verified_box: tuple = None
+    verified_at: float = 0
+    verified_gallery = None
+
+    def __init__(self, track_id: int, box: tuple):
+        self.track_id = track_id
+        self.box = box
+
+
+# Associates the faces of consecutive frames by their overlap,
+# so identified persons don't have to be encoded again in every frame.
+class FaceTracker:
+    min_overlap: float
+    reverify_overlap: float
+    reverify_interval: float
+    max_missed_frames: int
+
+    tracks: list[Track]
+    next_track_id: int = 1
+
+    def __init__(self, min_overlap: float, reverify_overlap: float, reverify_interval: float,
+                 max_missed_frames: int):
+        self.min_overlap = min_overlap
+        self.reverify_overlap = reverify_overlap
+        self.reverify_interval = reverify_interval
+        self.max_missed_frames = max_missed_frames
+        self.tracks = []
+
+    # Assign every box to a track. Returns the tracks in the order of the boxes.
+    def update(self, boxes) -> list[Track]:
+        # Greedily pair boxes and tracks with the highest overlap first.
+        pairs = sorted(((box_iou(box, track.box), i, track) for i, box in enumerate(boxes) for track in self.tracks),
+                       key=lambda pair: pair[0], reverse=True)
+
+        assigned: list[Track] = [None] * len(boxes)
+        used = set()
+        for overlap, i, track in pairs:
+            if overlap < self.min_overlap:
+                break
+            if assigned[i] is not None or track.track_id in used:
+                continue
+
+            assigned[i] = track
+            used.add(track.track_id)
+
+        # Forget tracks that were not seen for too long.
+        for track in self.tracks:
+            if track.track_id not in used:
+                track.missed_frames += 1
+        self.tracks = [track for track in self.tracks if track.missed_frames <= self.max_missed_frames]
+
+        # Start new tracks for new faces.
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                assigned[i] = Track(self.next_track_id, box)
+                self.next_track_id += 1
+                self.tracks.append(assigned[i])
+
+            assigned[i].box = box
+            assigned[i].missed_frames = 0
+
+        return assigned
+
+    # Check if the face of the track has to be encoded and compared again.
+    # Unknown faces are checked in every frame, identified ones only periodically or after moving.
+    def needs_verification(self, track: Track, gallery) -> bool:
+        if not track.verified or not track.authorized or track.verified_gallery is not gallery:
+            return True
+
+        if time.monotonic() - track.verified_at >= self.reverify_interval:
+            return True
+
+        return box_iou(track.box, track.verified_box) < self.reverify_overlap
+
+    @staticmethod
+    def verify(track: Track, gallery, authorized: bool, name: str, distance: float):
+        track.verified = True
+        track.authorized = authorized
+        track.name = name
+        track.distance = distance
+        track.verified_box = track.box
+        track.verified_at = time.monotonic()
+        track.verified_gallery = gallery
@@ -0,0 +1,88 @@
+import logging
+import os.path
+
+import cv2
+
+from objects.FrameRing import FrameRing
+from objects.Metrics import Metrics
+from objects.util.fileutils import list_files
+
+
+# Camera that plays a video file or a folder of images, e.g. to benchmark the recognition offline.
+# Unlike the stream camera every frame is handed out, frames are decoded when the next one is requested.
+class FileCamera:
+    name: str
+    stream_link: str
+    capture = None
+    image_files: list[str] = None
+
+    metrics: Metrics
+    frames: FrameRing
+    frame_sequence: int = 0
+    finished: bool = False
+
+    def __init__(self, stream_link: str, metrics: Metrics = None, max_frames: int = 0, name: str = "File"):
+        self.name = name
+        self.stream_link = stream_link
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.labels = {"camera": name}
+        self.frames = FrameRing(2)
+        self.frame_listeners = []
+        self.max_frames = max_frames
+
+        self.connect()
+
+    def is_connected(self):
+        return not self.finished and (self.image_files is not None or
+                                      (self.capture is not None and self.capture.isOpened()))
+
+    def connect(self):
+        self.frame_sequence = 0
+        self.finished = False
+
+        if os.path.isdir(self.stream_link):
+            self.image_files = sorted(list_files(self.stream_link))
+            logging.info(f"Playing {len(self.image_files)} images of folder: {self.stream_link}")
+        else:
+            self.capture = cv2.VideoCapture(self.stream_link)
+            if not self.capture.isOpened():
+                logging.warning(f"Failed to open video file: {self.stream_link}")
+
+    def disconnect(self):
+        if self.capture is not None:
+            self.capture.release()
+
+        self.finished = True
+
+    def __decode(self, buffer):
+        if self.image_files is not None:
+            while self.frame_sequence < len(self.image_files):
+                frame = cv2.imread(os.path.join(self.stream_link, self.image_files[self.frame_sequence]))
+                if frame is not None:
+                    return frame
+
+                # Skip files that are no images.
+                self.image_files.pop(self.frame_sequence)
+
+            return None
+
+        success, frame = self.capture.read(buffer)
+        return frame if success else None
+
+    # Decode the next frame and borrow it. Returns None as frame after the last one.
+    def wait_for_frame(self, last_sequence: int, timeout: float = 1.0):
+        if not self.is_connected() or 0 < self.max_frames <= self.frame_sequence:
+            self.finished = True
+            return last_sequence, None
+
+        index, buffer = self.frames.acquire()
+        with self.metrics.time("decode", self.labels):
+            frame = self.__decode(buffer)
+
+        if frame is None:
+            self.finished = True
+            return last_sequence, None
+
+        self.frame_sequence = self.frames.commit(index, frame)
+
+        return self.frame_sequence, self.frames.borrow(self.frame_sequence)
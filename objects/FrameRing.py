@@ -0,0 +1,109 @@
+from threading import Lock
+
+
+# Frame of a FrameRing, that is not overwritten until it was released.
+class BorrowedFrame:
+    def __init__(self, ring, index: int, generation: int, sequence: int, frame):
+        self.ring = ring
+        self.index = index
+        self.generation = generation
+        self.sequence = sequence
+        self.frame = frame
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.ring.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+# Fixed amount of frame buffers, that the camera decodes into one after another.
+# Keeps the newest frames available, without allocating a new array for every frame.
+# Borrowed frames are skipped by the writer, so readers never see a frame while it is overwritten.
+class FrameRing:
+    size: int
+    # Sequence number of the newest frame.
+    sequence: int = 0
+
+    def __init__(self, size: int):
+        self.size = max(2, size)
+        self.lock = Lock()
+
+        # Buffers are allocated by the first decoded frame of the camera.
+        self.frames = [None] * self.size
+        # Sequence number of the frame in every slot, 0 while it is empty or written.
+        self.sequences = [0] * self.size
+        self.borrows = [0] * self.size
+        # Incremented whenever a borrowed buffer is taken out of its slot.
+        self.generations = [0] * self.size
+
+        # Amount of buffers that were replaced, because every slot was borrowed.
+        self.replaced_buffers = 0
+
+    # Find the slot for the next frame. Returns its index and the buffer to decode into, None to allocate one.
+    def acquire(self):
+        with self.lock:
+            free = [i for i in range(self.size) if self.borrows[i] == 0]
+            index = min(free if len(free) > 0 else range(self.size), key=lambda i: self.sequences[i])
+
+            # Every slot is borrowed. The readers keep the old buffer, the slot gets a new one.
+            if self.borrows[index] > 0:
+                self.frames[index] = None
+                self.borrows[index] = 0
+                self.generations[index] += 1
+                self.replaced_buffers += 1
+
+            self.sequences[index] = 0
+            return index, self.frames[index]
+
+    # Store the decoded frame in the slot. Returns the sequence number of the frame.
+    def commit(self, index: int, frame) -> int:
+        with self.lock:
+            self.sequence += 1
+            self.frames[index] = frame
+            self.sequences[index] = self.sequence
+            return self.sequence
+
+    def __find(self, sequence: int):
+        if sequence <= 0:
+            return None
+
+        for i in range(self.size):
+            if self.sequences[i] == sequence:
+                return i
+
+        return None
+
+    def __borrow(self, index: int) -> BorrowedFrame:
+        self.borrows[index] += 1
+        return BorrowedFrame(self, index, self.generations[index], self.sequences[index], self.frames[index])
+
+    # Borrow the frame with the given sequence number, or the newest one. Returns None if it is gone.
+    def borrow(self, sequence: int = None):
+        with self.lock:
+            index = self.__find(self.sequence if sequence is None else sequence)
+            return self.__borrow(index) if index is not None else None
+
+    # Borrow up to count of the newest frames, newest first.
+    def recent(self, count: int = None) -> list[BorrowedFrame]:
+        with self.lock:
+            indices = sorted((i for i in range(self.size) if self.sequences[i] > 0),
+                             key=lambda i: self.sequences[i], reverse=True)
+            return [self.__borrow(i) for i in indices[:count]]
+
+    def release(self, borrowed: BorrowedFrame):
+        with self.lock:
+            if self.generations[borrowed.index] == borrowed.generation:
+                self.borrows[borrowed.index] -= 1
+
+    # Forget all frames, e.g. after a reconnect. Borrowed buffers stay valid.
+    def clear(self):
+        with self.lock:
+            for i in range(self.size):
+                self.sequences[i] = 0
@@ -0,0 +1,72 @@
+import os.path
+import re
+from datetime import datetime
+
+from objects.util.timeutils import datetime_to_string
+
+
+# A history image and the details of the recognition, that saved it.
+class HistoryEvent:
+    time: datetime
+    person: str
+    # Face distance of the person, None if unknown.
+    distance: float = None
+    camera: str = ""
+    file: str
+    thumbnail: bool = False
+    # Size (in bytes) of the image and its thumbnail.
+    size: int = 0
+
+    def __init__(self, time: datetime, person: str, distance: float = None, camera: str = "", file: str = "",
+                 thumbnail: bool = False, size: int = 0):
+        self.time = time
+        self.person = person
+        self.distance = distance
+        self.camera = camera
+        self.file = file
+        self.thumbnail = thumbnail
+        self.size = size
+
+    # File name like "2024.01.31_08.15.00_Name_Camera.png". Cameras can save the same person in the same second,
+    # so the camera is part of the name. Further images of the same second get a counter, e.g. "_Camera.2.png".
+    @staticmethod
+    def to_file_name(time: datetime, person: str, camera: str, extension: str, counter: int = 1) -> str:
+        suffix = re.sub(r"[^A-Za-z0-9-]", "-", camera)
+        if counter > 1:
+            suffix += f".{counter}"
+
+        return f"{datetime_to_string(time)}_{person}" + (f"_{suffix}" if suffix else "") + f".{extension}"
+
+    # Read the details from a file name like above or "2024.01.31_08.15.00_Name.png" of older versions.
+    # Returns None for other files.
+    @staticmethod
+    def from_file_name(file: str, thumbnail: bool = False, size: int = 0):
+        split = os.path.splitext(file)[0].split("_")
+        if len(split) not in (3, 4):
+            return None
+
+        try:
+            time = datetime.strptime(f"{split[0]}_{split[1]}", "%Y.%m.%d_%H.%M.%S")
+        except ValueError:
+            return None
+
+        camera = split[3].split(".")[0] if len(split) == 4 else ""
+        return HistoryEvent(time, split[2], camera=camera, file=file, thumbnail=thumbnail, size=size)
+
+    def to_json(self):
+        return {
+            "name": self.person,
+            "file": self.file,
+            "camera": self.camera,
+            "distance": self.distance,
+            "thumbnail": self.thumbnail,
+            "size": self.size,
+            "timestamp": {
+                "year": f"{self.time.year}",
+                "month": f"{self.time.month:02d}",
+                "day": f"{self.time.day:02d}",
+                "hour": f"{self.time.hour:02d}",
+                "minute": f"{self.time.minute:02d}",
+                "second": f"{self.time.second:02d}"
+            }
+        }
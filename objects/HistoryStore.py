@@ -0,0 +1,179 @@
+import logging
+import sqlite3
+from datetime import datetime
+from threading import Lock
+
+from objects.HistoryEvent import HistoryEvent
+
+
+# Index of the history images in SQLite, so the history can be queried without listing the folder.
+# The index can be rebuilt from the file names of the images, if it is deleted.
+class HistoryStore:
+    file: str
+    # Amount of events in the index and the size (in bytes) of their files.
+    count: int = 0
+    total_size: int = 0
+
+    def __init__(self, file: str):
+        self.file = file
+        self.lock = Lock()
+
+        # Used by the history writer and the api threads, all access is serialized by the lock.
+        self.connection = sqlite3.connect(file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS events ("
+                                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                "timestamp REAL NOT NULL, "
+                                "person TEXT NOT NULL, "
+                                "distance REAL, "
+                                "camera TEXT NOT NULL DEFAULT '', "
+                                "file TEXT NOT NULL UNIQUE, "
+                                "thumbnail INTEGER NOT NULL DEFAULT 0, "
+                                "size INTEGER NOT NULL DEFAULT 0)")
+
+        # Indexes of older versions do not know the size of the files.
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(events)")]
+        if "size" not in columns:
+            self.connection.execute("ALTER TABLE events ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+
+        self.connection.execute("CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS events_person ON events (person, timestamp)")
+        self.connection.commit()
+
+        self.count, self.total_size = self.connection.execute("SELECT COUNT(*), TOTAL(size) FROM events").fetchone()
+        self.total_size = int(self.total_size)
+
+    # Add images saved before the index existed. Their details are taken from the file names.
+    def import_files(self, files: list[str], thumbnails: set, sizes: dict = None):
+        sizes = sizes if sizes is not None else {}
+
+        events = []
+        for file in files:
+            event = HistoryEvent.from_file_name(file, file in thumbnails, sizes.get(file, 0))
+            if event is None:
+                logging.warning(f"Failed to split history image into details: {file}")
+                continue
+
+            events.append(event)
+
+        events.sort(key=lambda e: e.time)
+        self.add(*events)
+
+        logging.info(f"Imported {len(events)} history images into the index.")
+
+    def add(self, *events: HistoryEvent):
+        with self.lock:
+            for event in events:
+                self.__delete("file = ?", (event.file,))
+                self.connection.execute("INSERT INTO events (timestamp, person, distance, camera, file, thumbnail, "
+                                        "size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        (event.time.timestamp(), event.person, event.distance, event.camera,
+                                         event.file, int(event.thumbnail), event.size))
+                self.count += 1
+                self.total_size += event.size
+
+            self.connection.commit()
+
+    # Delete the matching events. Returns their files.
+    def __delete(self, condition: str, params: tuple) -> list[str]:
+        rows = self.connection.execute(f"SELECT id, file, size FROM events WHERE {condition}", params).fetchall()
+        self.__delete_rows(rows)
+        return [row[1] for row in rows]
+
+    def __delete_rows(self, rows: list):
+        self.connection.executemany("DELETE FROM events WHERE id = ?", [(row[0],) for row in rows])
+        self.count -= len(rows)
+        self.total_size -= sum(row[2] for row in rows)
+
+    def remove(self, file: str) -> bool:
+        with self.lock:
+            removed = self.__delete("file = ?", (file,))
+            self.connection.commit()
+
+        return len(removed) > 0
+
+    # Remove the oldest events from the index. Returns their files.
+    def remove_oldest(self, amount: int) -> list[str]:
+        if amount <= 0:
+            return []
+
+        with self.lock:
+            rows = self.connection.execute("SELECT id, file, size FROM events ORDER BY timestamp, id LIMIT ?",
+                                           (amount,)).fetchall()
+            self.__delete_rows(rows)
+            self.connection.commit()
+
+        return [row[1] for row in rows]
+
+    # Remove the oldest events, until their files take at most max_size bytes. Returns their files.
+    def remove_oversized(self, max_size: int) -> list[str]:
+        with self.lock:
+            rows = []
+            excess = self.total_size - max_size
+            for row in self.connection.execute("SELECT id, file, size FROM events ORDER BY timestamp, id"):
+                if excess <= 0:
+                    break
+
+                rows.append(row)
+                excess -= row[2]
+
+            self.__delete_rows(rows)
+            self.connection.commit()
+
+        return [row[1] for row in rows]
+
+    # Remove all events before the time. Returns their files.
+    def remove_before(self, time: datetime) -> list[str]:
+        with self.lock:
+            files = self.__delete("timestamp < ?", (time.timestamp(),))
+            self.connection.commit()
+
+        return files
+
+    # Remove the oldest events of every person with more than the given amount. Returns their files.
+    def remove_over_quota(self, quota: int) -> list[str]:
+        with self.lock:
+            rows = []
+            persons = self.connection.execute("SELECT person, COUNT(*) FROM events GROUP BY person "
+                                              "HAVING COUNT(*) > ?", (quota,)).fetchall()
+            for person, amount in persons:
+                rows += self.connection.execute("SELECT id, file, size FROM events WHERE person = ? "
+                                                "ORDER BY timestamp, id LIMIT ?", (person, amount - quota)).fetchall()
+
+            self.__delete_rows(rows)
+            self.connection.commit()
+
+        return [row[1] for row in rows]
+
+    # Newest events first, optionally only of a person and inside a time range.
+    def query(self, limit: int = 100, offset: int = 0, person: str = None,
+              start: datetime = None, end: datetime = None) -> tuple[list[HistoryEvent], int]:
+        conditions = []
+        params = []
+        if person is not None:
+            conditions.append("person = ?")
+            params.append(person)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end.timestamp())
+
+        where = f" WHERE {' AND '.join(conditions)}" if len(conditions) > 0 else ""
+
+        with self.lock:
+            total = self.count if len(conditions) == 0 else \
+                self.connection.execute(f"SELECT COUNT(*) FROM events{where}", params).fetchone()[0]
+            rows = self.connection.execute(f"SELECT timestamp, person, distance, camera, file, thumbnail, size "
+                                           f"FROM events{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                                           params + [limit, offset]).fetchall()
+
+        events = [HistoryEvent(datetime.fromtimestamp(row[0]), row[1], row[2], row[3], row[4], bool(row[5]), row[6])
+                  for row in rows]
+        return events, total
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
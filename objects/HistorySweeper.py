@@ -0,0 +1,32 @@
+import logging
+import time
+from threading import Thread
+
+from objects.Metrics import Metrics
+
+
+# Enforces the retention of the history periodically in a background thread, so saving an image does not have to.
+class HistorySweeper:
+    # Time (in s) between two sweeps.
+    interval: float
+    metrics: Metrics
+
+    def __init__(self, sweep, interval: float = 60.0, metrics: Metrics = None):
+        self.sweep = sweep
+        self.interval = max(1.0, interval)
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.thread = Thread(target=self.__work, name="HistorySweeper")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __work(self):
+        while True:
+            try:
+                with self.metrics.time("history_sweep"):
+                    deleted = self.sweep()
+                self.metrics.increment("history_swept", deleted)
+            except Exception as e:
+                logging.exception(f"Failed to clean up the history: {e}")
+
+            time.sleep(self.interval)
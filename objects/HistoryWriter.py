@@ -0,0 +1,49 @@
+import logging
+from queue import Queue, Full
+from threading import Thread
+
+from objects.Metrics import Metrics
+
+
+# Writes history images in a background thread, so the recognition does not wait for the disk.
+# While the queue is full, new images are dropped instead of blocking the recognition.
+class HistoryWriter:
+    metrics: Metrics
+
+    def __init__(self, write, queue_size: int = 16, metrics: Metrics = None):
+        # Called with the arguments of submit() in the background thread.
+        self.write = write
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.queue = Queue(max(1, queue_size))
+
+        self.thread = Thread(target=self.__work, name="HistoryWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    # Queue an image. The image must not be modified afterwards. Returns False, if it was dropped.
+    def submit(self, *args) -> bool:
+        try:
+            self.queue.put_nowait(args)
+        except Full:
+            self.metrics.increment("history_dropped")
+            logging.warning("History queue is full, dropped image.")
+            return False
+
+        self.metrics.set_gauge("history_queue", self.queue.qsize())
+        return True
+
+    def __work(self):
+        while True:
+            args = self.queue.get()
+            try:
+                with self.metrics.time("history_write"):
+                    self.write(*args)
+            except Exception as e:
+                logging.exception(f"Failed to write history image: {e}")
+            finally:
+                self.queue.task_done()
+                self.metrics.set_gauge("history_queue", self.queue.qsize())
+
+    # Block until all queued images were written.
+    def join(self):
+        self.queue.join()
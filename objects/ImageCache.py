@@ -0,0 +1,70 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+
+import cv2
+
+from objects.Metrics import Metrics
+from objects.util.imageutils import thumbnail
+
+
+# Least recently used cache of resized and encoded images, e.g. for the thumbnails of the dashboard.
+# Entries are keyed by the modification time of the file, so changed files are resized again.
+class ImageCache:
+    # Maximum size (in bytes) of all cached images.
+    max_bytes: int
+    size: int = 0
+    # Jpeg quality of the resized images.
+    quality: int = 80
+    metrics: Metrics
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, metrics: Metrics = None):
+        self.max_bytes = max_bytes
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.lock = Lock()
+
+        # (file, mtime, size, width) -> encoded jpeg
+        self.entries: OrderedDict[tuple, bytes] = OrderedDict()
+
+    # Get the image scaled down to the width as jpeg. Returns None, if the file cannot be read.
+    def get(self, file: str, width: int, stat: os.stat_result = None):
+        stat = stat if stat is not None else os.stat(file)
+        key = (file, stat.st_mtime_ns, stat.st_size, width)
+
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.metrics.increment("image_cache_hits")
+                return data
+
+        self.metrics.increment("image_cache_misses")
+
+        image = cv2.imread(file)
+        if image is None:
+            return None
+
+        success, encoded = cv2.imencode(".jpg", thumbnail(image, width), [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not success:
+            return None
+
+        data = encoded.tobytes()
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = data
+                self.size += len(data)
+
+            # Evict the least recently used images.
+            while self.size > self.max_bytes and len(self.entries) > 0:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+            self.metrics.set_gauge("image_cache_bytes", self.size)
+
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.metrics.set_gauge("image_cache_bytes", 0)
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+
+
+# Squared distances between all rows of a and b.
+def squared_distances(a: np.ndarray, b: np.ndarray, b_squared_norms: np.ndarray) -> np.ndarray:
+    distances = a @ b.T
+    distances *= -2.0
+    distances += b_squared_norms
+    distances += np.einsum("ij,ij->i", a, a)[:, np.newaxis]
+    np.maximum(distances, 0.0, out=distances)
+    return distances
+
+
+# Index of the nearest centroid for every row, in chunks to limit the size of the distance matrix.
+def nearest_centroids(encodings: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(encodings), dtype=np.intp)
+    for start in range(0, len(encodings), chunk_size):
+        chunk = encodings[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmin(squared_distances(chunk, centroids, centroid_norms), axis=1)
+
+    return assignments
+
+
+# Approximate nearest neighbour index (inverted file) over the encodings of a gallery.
+# The encodings are clustered with k-means, a search only compares the faces of the closest clusters.
+# Like the gallery, the index is immutable. Changes return a new index, that shares the untouched lists.
+class IvfIndex:
+    # (k x 128) cluster centers and their squared norms.
+    centroids: np.ndarray
+    centroid_norms: np.ndarray
+    # Gallery rows of every cluster.
+    lists: tuple[np.ndarray, ...]
+    # Amount of closest clusters searched per face.
+    probes: int
+    # Size of the gallery the clusters were trained with.
+    trained_size: int
+
+    def __init__(self, centroids: np.ndarray, lists: tuple, probes: int, trained_size: int):
+        self.centroids = centroids
+        self.centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        self.lists = lists
+        self.probes = max(1, min(probes, len(centroids)))
+        self.trained_size = trained_size
+
+    # Cluster the encodings into about sqrt(n) lists.
+    @staticmethod
+    def build(encodings: np.ndarray, probes: int = 8, iterations: int = 10, seed: int = 0):
+        amount = len(encodings)
+        clusters = max(1, int(round(math.sqrt(amount))))
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample, the clusters do not get much better with more faces.
+        sample = encodings[rng.choice(amount, min(amount, clusters * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), clusters, replace=False)].astype(np.float32)
+
+        for i in range(iterations):
+            assignments = nearest_centroids(sample, centroids)
+            counts = np.bincount(assignments, minlength=clusters)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+
+            # Empty clusters keep their center.
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+
+        assignments = nearest_centroids(encodings, centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=clusters))[:-1]
+
+        return IvfIndex(centroids, tuple(np.split(order, bounds)), probes, amount)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.lists)
+
+    # Create a new index with an additional gallery row.
+    def with_row(self, encoding: np.ndarray, row: int):
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(1, -1)
+        cluster = nearest_centroids(encoding, self.centroids)[0]
+
+        lists = list(self.lists)
+        lists[cluster] = np.append(lists[cluster], row)
+        return IvfIndex(self.centroids, tuple(lists), self.probes, self.trained_size)
+
+    # Create a new index with the same clusters for other rows, e.g. after templates moved or were renumbered.
+    def with_encodings(self, encodings: np.ndarray):
+        assignments = nearest_centroids(encodings, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))[:-1]
+
+        return IvfIndex(self.centroids, tuple(np.split(order, bounds)), self.probes, self.trained_size)
+
+    # Create a new index without the gallery rows. The following rows move up, like in the gallery.
+    def without_rows(self, rows):
+        rows = np.sort(np.asarray(rows, dtype=np.intp))
+
+        lists = []
+        for cluster_rows in self.lists:
+            kept = cluster_rows[~np.isin(cluster_rows, rows)]
+            lists.append(kept - np.searchsorted(rows, kept))
+
+        return IvfIndex(self.centroids, tuple(lists), self.probes, self.trained_size)
+
+    # Best matching row and its distance for each face. Rows are -1, if no cluster close to a face has any row.
+    def search(self, faces: np.ndarray, encodings: np.ndarray, squared_norms: np.ndarray):
+        amount = len(faces)
+        best_matches = np.full(amount, -1, dtype=np.intp)
+        best_distances = np.full(amount, np.inf, dtype=np.float32)
+
+        centroid_distances = squared_distances(faces, self.centroids, self.centroid_norms)
+        if self.probes < len(self.centroids):
+            closest = np.argpartition(centroid_distances, self.probes - 1, axis=1)[:, :self.probes]
+        else:
+            closest = np.broadcast_to(np.arange(len(self.centroids)), (amount, len(self.centroids)))
+
+        for i in range(amount):
+            candidates = np.concatenate([self.lists[cluster] for cluster in closest[i]])
+            if len(candidates) == 0:
+                continue
+
+            distances = squared_distances(faces[i:i + 1], encodings[candidates], squared_norms[candidates])[0]
+            best = np.argmin(distances)
+            best_matches[i] = candidates[best]
+            best_distances[i] = math.sqrt(distances[best])
+
+        return best_matches, best_distances
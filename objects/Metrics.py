@@ -0,0 +1,163 @@
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+
+# Durations of a single stage.
+class Latency:
+    # Upper bounds (in s) of the histogram buckets.
+    buckets: tuple = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    # Amount of recent durations kept for percentiles.
+    sample_size: int = 10000
+
+    count: int = 0
+    total: float = 0.0
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(self.buckets)
+        self.samples = deque(maxlen=self.sample_size)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+        for i, bucket in enumerate(self.buckets):
+            if seconds <= bucket:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, percent: float) -> float:
+        if len(self.samples) == 0:
+            return 0.0
+
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def to_json(self):
+        return {
+            "count": self.count,
+            "average_ms": self.total / self.count * 1000 if self.count > 0 else 0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000
+        }
+
+
+# Counters, gauges and stage latencies of the recognition pipeline.
+# Every value can carry labels, e.g. the camera it belongs to.
+class Metrics:
+    prefix: str = "raspifaceid"
+
+    def __init__(self):
+        self.lock = Lock()
+
+        # (name, labels) -> value
+        self.counters: dict[tuple, int] = {}
+        self.gauges: dict[tuple, float] = {}
+        self.latencies: dict[tuple, Latency] = {}
+
+    @staticmethod
+    def key(name: str, labels: dict = None):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    @staticmethod
+    def format_labels(labels: tuple) -> str:
+        if len(labels) == 0:
+            return ""
+
+        return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+    @contextmanager
+    def time(self, stage: str, labels: dict = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, labels)
+
+    def observe(self, stage: str, seconds: float, labels: dict = None):
+        key = self.key(stage, labels)
+        with self.lock:
+            latency = self.latencies.get(key)
+            if latency is None:
+                latency = self.latencies[key] = Latency()
+
+            latency.observe(seconds)
+
+    def increment(self, counter: str, amount: int = 1, labels: dict = None):
+        key = self.key(counter, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, gauge: str, value: float, labels: dict = None):
+        with self.lock:
+            self.gauges[self.key(gauge, labels)] = value
+
+    def get_counter(self, counter: str, labels: dict = None) -> int:
+        with self.lock:
+            return self.counters.get(self.key(counter, labels), 0)
+
+    def get_latency(self, stage: str, labels: dict = None) -> Latency:
+        with self.lock:
+            return self.latencies.get(self.key(stage, labels))
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.latencies.clear()
+
+    def to_json(self):
+        with self.lock:
+            return {
+                "counters": {name + self.format_labels(labels): value
+                             for (name, labels), value in self.counters.items()},
+                "gauges": {name + self.format_labels(labels): value
+                           for (name, labels), value in self.gauges.items()},
+                "latencies": {stage + self.format_labels(labels): latency.to_json()
+                              for (stage, labels), latency in self.latencies.items()}
+            }
+
+    # Render all metrics in the text format of Prometheus.
+    def to_prometheus(self) -> str:
+        lines = []
+
+        with self.lock:
+            last_name = None
+            for (counter, labels), value in sorted(self.counters.items()):
+                name = f"{self.prefix}_{counter}_total"
+                if name != last_name:
+                    lines.append(f"# TYPE {name} counter")
+                    last_name = name
+
+                lines.append(f"{name}{self.format_labels(labels)} {value}")
+
+            for (gauge, labels), value in sorted(self.gauges.items()):
+                name = f"{self.prefix}_{gauge}"
+                if name != last_name:
+                    lines.append(f"# TYPE {name} gauge")
+                    last_name = name
+
+                lines.append(f"{name}{self.format_labels(labels)} {value}")
+
+            name = f"{self.prefix}_stage_seconds"
+            lines.append(f"# HELP {name} Duration of the stages of the recognition, camera and gpio.")
+            lines.append(f"# TYPE {name} histogram")
+
+            for (stage, labels), latency in sorted(self.latencies.items()):
+                stage_labels = (("stage", stage),) + labels
+
+                cumulative = 0
+                for bucket, count in zip(latency.buckets, latency.bucket_counts):
+                    cumulative += count
+                    bucket_labels = self.format_labels(stage_labels + (("le", bucket),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+
+                bucket_labels = self.format_labels(stage_labels + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{bucket_labels} {latency.count}")
+                lines.append(f"{name}_sum{self.format_labels(stage_labels)} {latency.total}")
+                lines.append(f"{name}_count{self.format_labels(stage_labels)} {latency.count}")
+
+        return "\n".join(lines) + "\n"
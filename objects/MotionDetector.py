@@ -0,0 +1,49 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# Cheap check if anything moved in front of the camera, so the face detection can be skipped for static scenes.
+class MotionDetector:
+    # Width of the downscaled frame that is compared.
+    width: int = 160
+    # Speed in which the background adapts to changes.
+    learning_rate: float = 0.05
+
+    sensitivity: int
+    min_changed_area: float
+    cooldown: float
+
+    background = None
+    last_motion: float = 0
+
+    def __init__(self, sensitivity: int, min_changed_area: float, cooldown: float):
+        self.sensitivity = sensitivity
+        self.min_changed_area = min_changed_area
+        self.cooldown = cooldown
+
+    # Check if the frame differs from the background. Stays True for the cooldown after the last motion.
+    def has_motion(self, frame_bgr) -> bool:
+        height, width = frame_bgr.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+
+        gray = cv2.cvtColor(cv2.resize(frame_bgr, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        now = time.monotonic()
+
+        # First frame or changed resolution.
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.last_motion = now
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, changed = cv2.threshold(diff, self.sensitivity, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if cv2.countNonZero(changed) >= self.min_changed_area * changed.size:
+            self.last_motion = now
+
+        return now - self.last_motion <= self.cooldown
@@ -1,13 +1,19 @@
 import logging
 import time
-from threading import Thread
+from queue import Queue, Empty
+from threading import Thread, Lock
 
 import pigpio
 
+from objects.Metrics import Metrics
 from objects.Timer import Timer
 
 
+# Controls the gpio of a pi over the network. Only the gpio thread talks to the pi, so callers never wait for it.
+# The connection thread checks the connection every second, everyone else uses its last result.
+# Requests to open an open door are coalesced, so every output must be controlled by only one instance.
 class RaspberryPi:
+    name: str
     ip_address: str
     gpio_id: int
     duration: float
@@ -15,27 +21,42 @@ class RaspberryPi:
 
     pi: pigpio
 
-    timer: Timer = Timer()
+    timer: Timer
+    # Interval (in s) to check, if the timer expired.
+    timer_interval: float = 0.1
 
+    # State of the gpio after all queued commands were written.
     current_state: bool = False
     toggle_allowed: bool = True
 
     connected: bool = False
 
-    def __init__(self, ip_address: str, gpio_id: int, duration: float, invert_output: bool):
+    metrics: Metrics
+
+    def __init__(self, ip_address: str, gpio_id: int, duration: float, invert_output: bool,
+                 metrics: Metrics = None, name: str = "Camera"):
+        self.name = name
         self.ip_address = ip_address
         self.gpio_id = gpio_id
         self.duration = duration
         self.invert_output = invert_output
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.labels = {"camera": name}
 
         if self.duration <= 0:
             self.duration = 1
 
+        self.timer = Timer()
+        # Serializes changes of the state and the timer, so the commands are queued in the right order.
+        self.lock = Lock()
+        # (state, time of the request)
+        self.commands = Queue()
+
         self.connect()
 
-        self.timer_thread = Thread(target=self.__check_timer)
-        self.timer_thread.daemon = True
-        self.timer_thread.start()
+        self.gpio_thread = Thread(target=self.__work, name=f"Gpio-{name}")
+        self.gpio_thread.daemon = True
+        self.gpio_thread.start()
 
         self.connection_thread = Thread(target=self.check_connection)
         self.connection_thread.daemon = True
@@ -43,7 +64,7 @@ class RaspberryPi:
 
     def check_connection(self):
         while True:
-            if not self.is_connected():
+            if not self.__probe():
                 if self.connected:
                     logging.warning("Lost connection to RaspberryPi...")
                     self.connected = False
@@ -51,28 +72,31 @@ class RaspberryPi:
 
                 self.connect()
 
-            time.sleep(1)
-
-    def __check_timer(self):
-        while True:
-            if not self.connected:
-                continue
-
-            if self.timer.is_expired() and self.current_state:
-                self.switch_gpio(False)
+                # Commands were dropped while the pi was not connected.
+                if self.connected:
+                    self.metrics.increment("pi_reconnects", labels=self.labels)
+                    with self.lock:
+                        self.__queue(self.current_state)
 
-            time.sleep(0.1)
+            time.sleep(1)
 
-    def is_connected(self):
-        if self.pi is None or not self.pi.connected:
+    # Read the gpio to check, if the pi still answers.
+    def __probe(self):
+        pi = self.pi
+        if pi is None or not pi.connected:
             return False
 
         try:
-            self.pi.read(self.gpio_id)
+            with self.metrics.time("gpio_read", self.labels):
+                pi.read(self.gpio_id)
             return True
         except Exception as e:
             return False
 
+    # Result of the last check of the connection thread.
+    def is_connected(self):
+        return self.connected
+
     def connect(self):
         # Connect to pi.
         logging.info(f"Trying to establish the connection to RaspberryPi on: {self.ip_address}")
@@ -85,29 +109,85 @@ class RaspberryPi:
         else:
             logging.warning("Failed to connect to RaspberryPi.")
 
+        self.metrics.set_gauge("pi_connected", int(self.connected), labels=self.labels)
+
     def set_toggle_allowed(self, allow_toggle):
         self.toggle_allowed = allow_toggle
 
         if not self.toggle_allowed:
             self.switch_gpio(False)
 
+    # Queue a command for the gpio thread. Returns False, if the pi is not connected.
+    # Opening an open door only extends its timer.
     def switch_gpio(self, state: bool, seconds: float = 3):
-        if not self.is_connected():
+        if not self.connected:
             logging.warning("Tried to toggle gpio while pi is not connected.")
             return False
 
         if seconds <= 0:
             seconds = self.duration
 
-        if state is not self.current_state:
-            logging.info("Opening door..." if state else "Closing door...")
+        with self.lock:
+            if state and self.current_state:
+                self.timer.start(seconds)
+                self.metrics.increment("gpio_coalesced", labels=self.labels)
+                return True
 
-        if state:
-            self.timer.start(seconds)
-        else:
-            self.timer.stop()
+            if state is not self.current_state:
+                logging.info("Opening door..." if state else "Closing door...")
+
+            if state:
+                self.timer.start(seconds)
+            else:
+                self.timer.stop()
 
-        self.pi.write(self.gpio_id, state if not self.invert_output else not state)
-        self.current_state = state
+            self.current_state = state
+            self.__queue(state)
 
         return True
+
+    def __queue(self, state: bool):
+        self.commands.put((state, time.perf_counter()))
+        self.metrics.set_gauge("gpio_queue", self.commands.qsize(), labels=self.labels)
+
+    # Close the door, if its timer expired.
+    def __check_timer(self):
+        with self.lock:
+            if self.current_state and self.timer.is_expired():
+                logging.info("Closing door...")
+                self.current_state = False
+                self.__queue(False)
+
+    def __work(self):
+        while True:
+            try:
+                state, requested = self.commands.get(timeout=self.timer_interval)
+            except Empty:
+                self.__check_timer()
+                continue
+
+            self.metrics.set_gauge("gpio_queue", self.commands.qsize(), labels=self.labels)
+            self.__write(state, requested)
+
+    def __write(self, state: bool, requested: float):
+        if not self.connected:
+            self.metrics.increment("gpio_dropped", labels=self.labels)
+            logging.warning("Dropped gpio command while pi is not connected.")
+            return
+
+        try:
+            with self.metrics.time("gpio_write", self.labels):
+                self.pi.write(self.gpio_id, state if not self.invert_output else not state)
+        except Exception as e:
+            self.metrics.increment("gpio_failed", labels=self.labels)
+            logging.warning(f"Failed to toggle gpio: {e}")
+
+            # A failed open is not coalesced with the following requests, a failed close is retried by the timer.
+            with self.lock:
+                if self.commands.empty():
+                    self.current_state = not state
+            return
+
+        # Time from the request to the switched output.
+        self.metrics.observe("gpio_actuation", time.perf_counter() - requested, self.labels)
+        self.metrics.increment("gpio_switches", labels=self.labels)
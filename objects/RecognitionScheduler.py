@@ -0,0 +1,92 @@
+import logging
+import time
+from threading import Thread, Condition
+
+from objects.FaceRecognizer import FaceRecognizer
+from objects.Metrics import Metrics
+
+
+# Shares a fixed amount of worker threads between the recognizers of all cameras.
+# Cameras are served round robin and each camera is analyzed by at most one worker at a time.
+# While all workers are busy, cameras only keep their newest frame, older ones are dropped.
+class RecognitionScheduler:
+    recognizers: list[FaceRecognizer]
+    metrics: Metrics
+
+    # Index of the recognizer that is checked first for the next frame.
+    next_index: int = 0
+
+    def __init__(self, recognizers: list[FaceRecognizer], workers: int, metrics: Metrics = None):
+        self.recognizers = recognizers
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.condition = Condition()
+        self.busy = set()
+        # Time every camera finished its last frame, to measure how long it waited for the next one.
+        self.finished = [time.perf_counter()] * len(recognizers)
+
+        for recognizer in recognizers:
+            recognizer.camera.frame_listeners.append(self.__notify)
+
+        workers = max(1, workers)
+        logging.info(f"Analyzing {len(recognizers)} cameras with {workers} workers.")
+
+        self.threads = []
+        for i in range(workers):
+            thread = Thread(target=self.__work, name=f"RecognitionWorker-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __notify(self):
+        with self.condition:
+            self.condition.notify()
+
+    # Find the next camera with a new frame, that is not analyzed right now.
+    def __next_job(self):
+        amount = len(self.recognizers)
+        for offset in range(amount):
+            index = (self.next_index + offset) % amount
+            if index in self.busy:
+                continue
+
+            recognizer = self.recognizers[index]
+            sequence, borrowed = recognizer.camera.wait_for_frame(recognizer.last_sequence, 0)
+            if borrowed is None:
+                continue
+
+            # Continue with the following camera next time.
+            self.next_index = (index + 1) % amount
+            return index, sequence, borrowed
+
+        return None
+
+    def __work(self):
+        while True:
+            with self.condition:
+                job = self.__next_job()
+                while job is None:
+                    # Also check regularly, in case a notification was missed.
+                    self.condition.wait(1)
+                    job = self.__next_job()
+
+                index, sequence, borrowed = job
+                self.busy.add(index)
+                self.metrics.set_gauge("busy_workers", len(self.busy))
+
+            recognizer = self.recognizers[index]
+            self.metrics.observe("wait", time.perf_counter() - self.finished[index], recognizer.labels)
+            recognizer.last_sequence = sequence
+
+            try:
+                with borrowed:
+                    recognizer.process_frame(borrowed.frame)
+            except Exception as e:
+                logging.exception(f"Failed to analyze frame of {recognizer.camera.name}: {e}")
+            finally:
+                with self.condition:
+                    self.finished[index] = time.perf_counter()
+                    self.busy.discard(index)
+                    self.metrics.set_gauge("busy_workers", len(self.busy))
+                    # The camera might have received frames in the meantime.
+                    self.condition.notify()
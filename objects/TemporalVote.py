@@ -0,0 +1,46 @@
+from collections import deque
+
+
+# Collects the matches of the last frames and only confirms a person, who matched in enough of them.
+# A single lucky match of a fast detector does not open the door, a person in front of the camera does.
+# Votes are counted per key, either the name of the person or the track of the face.
+class TemporalVote:
+    # A person is confirmed after matching in required_frames of the last frames.
+    frames: int
+    required_frames: int
+    # Maximum mean distance of the matches in the window, 0 to only count them.
+    max_mean_distance: float
+
+    def __init__(self, frames: int = 5, required_frames: int = 3, max_mean_distance: float = 0.0):
+        self.frames = max(1, frames)
+        self.required_frames = min(max(1, required_frames), self.frames)
+        self.max_mean_distance = max_mean_distance
+
+        # Matches of every frame: key -> distance
+        self.window = deque(maxlen=self.frames)
+        self.confirmed = set()
+
+    def is_confirmed(self, key) -> bool:
+        return key in self.confirmed
+
+    # Add the authorized matches of a frame. Returns the keys, that are confirmed now.
+    # Confirmed keys stay confirmed, until they did not match in any frame of the window.
+    def add_frame(self, votes: dict) -> set:
+        self.window.append(votes)
+
+        distances = {}
+        for frame_votes in self.window:
+            for key, distance in frame_votes.items():
+                distances.setdefault(key, []).append(distance)
+
+        self.confirmed &= distances.keys()
+        for key, key_distances in distances.items():
+            if key in self.confirmed or key not in votes or len(key_distances) < self.required_frames:
+                continue
+
+            if self.max_mean_distance > 0 and sum(key_distances) / len(key_distances) > self.max_mean_distance:
+                continue
+
+            self.confirmed.add(key)
+
+        return set(self.confirmed)
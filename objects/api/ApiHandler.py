@@ -1,43 +1,95 @@
-import logging
+import os
+from datetime import datetime
 
-from flask import send_file
+from flask import send_file, request, Response
 
 from objects.Camera import Camera
 from objects.Config import Config
 from objects.FaceHandler import FaceHandler
+from objects.FaceRecognizer import FaceRecognizer
+from objects.ImageCache import ImageCache
+from objects.Metrics import Metrics
 from objects.RaspberryPi import RaspberryPi
-from objects.util.faceutils import find_faces
+from objects.detector.FaceDetector import FaceDetector
+from objects.util.faceutils import find_faces, sharpness
+from objects.util.imageutils import image_mimetype
 
 
 class ApiHandler:
     config: Config
-    camera: Camera
-    pi: RaspberryPi
+    recognizers: list[FaceRecognizer]
     face_handler: FaceHandler
-
-    def __init__(self, config: Config, camera: Camera, pi: RaspberryPi, face_handler: FaceHandler):
+    detector: FaceDetector
+    metrics: Metrics
+    image_cache: ImageCache
+
+    # Largest width (in px) of resized images. Widths are rounded to a multiple of the step, to limit the variants.
+    max_image_width: int = 2048
+    image_width_step: int = 16
+    # Time (in s) browsers may reuse history images without asking again. They never change.
+    history_max_age: int = 3600
+
+    def __init__(self, config: Config, recognizers: list[FaceRecognizer], face_handler: FaceHandler,
+                 detector: FaceDetector = None, metrics: Metrics = None, image_cache: ImageCache = None):
         self.config = config
-        self.camera = camera
-        self.pi = pi
+        self.recognizers = recognizers
         self.face_handler = face_handler
+        self.detector = detector
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.image_cache = image_cache if image_cache is not None else ImageCache(metrics=self.metrics)
+
+    # Camera and pi of the first camera, used if a request does not name a camera.
+    @property
+    def camera(self) -> Camera:
+        return self.recognizers[0].camera
+
+    @property
+    def pi(self) -> RaspberryPi:
+        return self.recognizers[0].pi
+
+    def get_recognizer(self, camera_name: str = None):
+        if camera_name is None:
+            return self.recognizers[0]
+
+        for recognizer in self.recognizers:
+            if recognizer.camera.name == camera_name:
+                return recognizer
+
+        return None
+
+    def get_camera_status(self, camera: Camera):
+        return {
+            "name": camera.name,
+            "connected": camera.is_connected(),
+            "stream_url": camera.stream_link,
+            "capture": camera.capture_options.to_json()
+        }
+
+    def get_pi_status(self, pi: RaspberryPi):
+        return {
+            "connected": pi.is_connected(),
+            "ip_address": pi.ip_address,
+            "gpio_id": pi.gpio_id,
+            "gpio_state": pi.current_state,
+            "toggle_from": self.config.settings_allow_toggle_from(),
+            "toggle_to": self.config.settings_allow_toggle_to()
+        }
 
     def get_status(self):
         return {
-            "camera": {
-                "connected": self.camera.is_connected(),
-                "stream_url": self.camera.stream_link
-            },
-            "pi": {
-                "connected": self.pi.is_connected(),
-                "ip_address": self.pi.ip_address,
-                "gpio_id": self.pi.gpio_id,
-                "gpio_state": self.pi.current_state,
-                "toggle_from": self.config.settings_allow_toggle_from(),
-                "toggle_to": self.config.settings_allow_toggle_to()
-            }
+            "camera": self.get_camera_status(self.camera),
+            "pi": self.get_pi_status(self.pi),
+            "cameras": [{
+                **self.get_camera_status(recognizer.camera),
+                "pi": self.get_pi_status(recognizer.pi)
+            } for recognizer in self.recognizers],
+            "detector": None if self.detector is None else self.detector.to_json()
         }, 200
 
-    def set_gpio_state(self, state: bool, duration: str):
+    def get_metrics(self):
+        return self.metrics.to_prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    def set_gpio_state(self, state: bool, duration: str, camera_name: str = None):
         if state and not duration.isdecimal():
             return "Invalid argument.", 400
 
@@ -45,7 +97,11 @@ class ApiHandler:
         if state and duration_number < 1:
             return "Duration to low.", 400
 
-        success = self.pi.switch_gpio(state, duration_number)
+        recognizer = self.get_recognizer(camera_name)
+        if recognizer is None:
+            return "Camera not found.", 404
+
+        success = recognizer.pi.switch_gpio(state, duration_number)
         if success:
             return "Success", 200
         else:
@@ -79,19 +135,75 @@ class ApiHandler:
         else:
             return "Failed to save.", 503
 
-    def get_image(self, image):
+    def get_regions(self):
+        return self.config.face_recognition_regions()
+
+    def set_regions(self, json):
+        regions = json.get("regions") if isinstance(json, dict) else None
+        if not isinstance(regions, list):
+            return "Invalid argument.", 400
+
+        try:
+            regions = [[(float(x), float(y)) for x, y in region] for region in regions]
+        except (TypeError, ValueError):
+            return "Invalid argument.", 400
+
+        success = self.config.set_face_recognition_regions(regions)
+        if success:
+            return self.get_regions()
+        else:
+            return "Points must be between 0 and 1 and regions need at least 2 points.", 400
+
+    def delete_regions(self):
+        self.config.set_face_recognition_regions([])
+        return self.get_regions()
+
+    # Send the image, scaled down to the width if given. Answers with 304, if the client has the same version.
+    def get_image(self, image, width: str = None, max_age: int = 0):
         if image is None:
             return "File not found.", 404
 
-        return send_file(image, "image/png")
+        stat = os.stat(image)
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+        if width is None:
+            return send_file(image, image_mimetype(image), etag=etag, last_modified=stat.st_mtime, max_age=max_age)
+
+        try:
+            width = int(width)
+        except ValueError:
+            return "Invalid width.", 400
+
+        width = min(max(round(width / self.image_width_step), 1) * self.image_width_step, self.max_image_width)
+
+        data = self.image_cache.get(image, width, stat)
+        if data is None:
+            return "Failed to read the image.", 500
 
-    def get_authorized_person_image(self, image_id: str):
+        response = Response(data, mimetype="image/jpeg")
+        response.set_etag(f"{etag}-{width}")
+        response.last_modified = stat.st_mtime
+        response.cache_control.max_age = max_age
+        response.cache_control.no_cache = max_age == 0
+        return response.make_conditional(request)
+
+    def get_authorized_person_image(self, image_id: str, width: str = None):
         image = self.face_handler.get_authorized_person_image_file(image_id)
-        return self.get_image(image)
+        return self.get_image(image, width)
+
+    def get_history_image(self, image_id: str, width: str = None):
+        image = self.face_handler.get_history_image_file(image_id)
+        return self.get_image(image, width, self.history_max_age)
+
+    # Use the stored thumbnail, otherwise scale down the image.
+    def get_history_thumbnail(self, image_id: str):
+        image = self.face_handler.get_history_thumbnail_file(image_id)
+        if image is not None:
+            return self.get_image(image, None, self.history_max_age)
 
-    def get_history_image(self, image_id: str):
         image = self.face_handler.get_history_image_file(image_id)
-        return self.get_image(image)
+        width = self.face_handler.thumbnail_width if self.face_handler.thumbnail_width > 0 else 320
+        return self.get_image(image, str(width), self.history_max_age)
 
     def get_authorized_persons(self) -> list[str]:
         json = []
@@ -100,21 +212,33 @@ class ApiHandler:
 
         return json
 
-    def create_authorized_person(self, name: str):
+    def create_authorized_person(self, name: str, camera_name: str = None):
         if name is None or len(name) == 0 or " " in name:
             return "Invalid name.", 400
 
-        image = self.camera.read()
-        if image is None or not self.camera.is_connected():
-            return "Camera error.", 503
+        recognizer = self.get_recognizer(camera_name)
+        if recognizer is None:
+            return "Camera not found.", 404
+
+        # Take the sharpest of the newest frames, e.g. the person might have moved in the newest one.
+        recent_frames = recognizer.camera.recent_frames()
+        try:
+            if len(recent_frames) == 0 or not recognizer.camera.is_connected():
+                return "Camera error.", 503
+
+            image = max(recent_frames, key=lambda borrowed: sharpness(borrowed.frame)).frame.copy()
+        finally:
+            for borrowed in recent_frames:
+                borrowed.release()
 
         face_locations, face_encodings, amount = find_faces(image)
-        if amount <= 1:
+        if amount < 1:
             return "No faces found.", 500
-        elif amount >= 1:
+        elif amount > 1:
             return "More than one face found.", 500
 
-        result = self.face_handler.create_authorized_person(image, name)
+        # Reuse the encoding, so the new face does not need to be encoded again.
+        result = self.face_handler.create_authorized_person(image, name, encoded_face=face_encodings[0])
         if result:
             return self.get_authorized_persons()
         else:
@@ -128,40 +252,21 @@ class ApiHandler:
         else:
             return "Failed to delete image.", 500
 
-    def get_history(self):
-        json = []
-        for file in self.face_handler.get_history_image_files():
-            split = file.split("_")
-
-            if len(split) != 3:
-                logging.warning(f"Failed to split history image into details: {file}")
-                continue
-
-            split_date = split[0].split(".")
-            year = split_date[0]
-            month = split_date[1]
-            day = split_date[2]
-
-            split_time = split[1].split(".")
-            hour = split_time[0]
-            minute = split_time[1]
-            second = split_time[2]
-
-            name = split[2].replace(".png", "")
-
-            json.append({
-                "name": name,
-                "file": file,
-                "timestamp": {
-                    "year": year,
-                    "month": month,
-                    "day": day,
-                    "hour": hour,
-                    "minute": minute,
-                    "second": second
-                }
-            })
-        return json
+    # Newest events first. Supports the query parameters limit, offset, person and from / to as ISO 8601 times.
+    # The amount of all matching events is returned in the X-Total-Count header.
+    def get_history(self, args: dict = None):
+        args = args if args is not None else {}
+
+        try:
+            limit = min(max(int(args.get("limit", 100)), 0), 1000)
+            offset = max(int(args.get("offset", 0)), 0)
+            start = datetime.fromisoformat(args["from"]) if args.get("from") else None
+            end = datetime.fromisoformat(args["to"]) if args.get("to") else None
+        except ValueError:
+            return "Invalid query parameters.", 400
+
+        events, total = self.face_handler.get_history(limit, offset, args.get("person") or None, start, end)
+        return [event.to_json() for event in events], 200, {"X-Total-Count": str(total)}
 
     def delete_history(self, file_name):
         result = self.face_handler.delete_history_image(file_name)
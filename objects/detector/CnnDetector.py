@@ -0,0 +1,16 @@
+import face_recognition
+
+from objects.detector.FaceDetector import FaceDetector
+
+
+# Convolutional neural network detector of dlib. Most accurate, but very slow without a GPU.
+class CnnDetector(FaceDetector):
+    name: str = "cnn"
+    upsample: int
+
+    def __init__(self, upsample: int = 1):
+        super().__init__()
+        self.upsample = upsample
+
+    def detect(self, image) -> list[tuple]:
+        return face_recognition.face_locations(image, self.upsample, "cnn")
@@ -0,0 +1,77 @@
+import time
+from threading import Lock
+
+import dlib
+import face_recognition
+import numpy as np
+
+
+# Base class of all face detectors. Subclasses implement detect().
+# All detectors share the dlib encoder of face_recognition, so encodings stay comparable to the reference images.
+class FaceDetector:
+    name: str = None
+
+    def __init__(self):
+        self.stats_lock = Lock()
+        self.latencies = {"detect": [0, 0.0, 0.0], "encode": [0, 0.0, 0.0]}
+
+    # Detect faces in an RGB image. Returns boxes (top, right, bottom, left).
+    def detect(self, image) -> list[tuple]:
+        raise NotImplementedError
+
+    def locate(self, image) -> list[tuple]:
+        start = time.perf_counter()
+        face_locations = self.detect(image)
+        self.record("detect", time.perf_counter() - start)
+
+        return face_locations
+
+    def encode(self, image, face_locations):
+        start = time.perf_counter()
+        encoded_faces = face_recognition.face_encodings(image, face_locations)
+        self.record("encode", time.perf_counter() - start)
+
+        return encoded_faces
+
+    # Encode the faces of several images with one call of the dlib network.
+    # The faces are aligned to chips like face_recognition does, the chips of all images are encoded together.
+    # Returns the encodings of every image.
+    def encode_batch(self, images: list, face_locations: list) -> list[list]:
+        start = time.perf_counter()
+
+        chips = []
+        amounts = []
+        for image, locations in zip(images, face_locations):
+            landmarks = face_recognition.api._raw_face_landmarks(image, locations, "small") if locations else []
+            chips += [dlib.get_face_chip(image, shape, 150, 0.25) for shape in landmarks]
+            amounts.append(len(landmarks))
+
+        descriptors = face_recognition.api.face_encoder.compute_face_descriptor(chips) if chips else []
+        self.record("encode", time.perf_counter() - start)
+
+        encoded_faces = []
+        offset = 0
+        for amount in amounts:
+            encoded_faces.append([np.array(descriptor) for descriptor in descriptors[offset:offset + amount]])
+            offset += amount
+
+        return encoded_faces
+
+    # Add the duration of a call to the statistics (calls, total and maximum time).
+    def record(self, stage: str, seconds: float):
+        with self.stats_lock:
+            latency = self.latencies[stage]
+            latency[0] += 1
+            latency[1] += seconds
+            latency[2] = max(latency[2], seconds)
+
+    def to_json(self):
+        with self.stats_lock:
+            return {
+                "name": self.name,
+                **{stage: {
+                    "calls": calls,
+                    "average_ms": total / calls * 1000 if calls > 0 else 0,
+                    "max_ms": maximum * 1000
+                } for stage, (calls, total, maximum) in self.latencies.items()}
+            }
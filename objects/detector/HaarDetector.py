@@ -0,0 +1,31 @@
+import os.path
+
+import cv2
+
+from objects.detector.FaceDetector import FaceDetector
+
+
+# Haar cascade detector of OpenCV. Fastest, but misses turned faces and finds more false faces.
+# With another detector, it is used as prefilter: the other detector only runs if the cascade found a face.
+class HaarDetector(FaceDetector):
+    name: str = "haar"
+    cascade_file: str = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+
+    detector: FaceDetector = None
+
+    def __init__(self, detector: FaceDetector = None):
+        super().__init__()
+        self.detector = detector
+        self.cascade = cv2.CascadeClassifier(self.cascade_file)
+
+        if detector is not None:
+            self.name = f"haar+{detector.name}"
+
+    def detect(self, image) -> list[tuple]:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+
+        if self.detector is not None:
+            return self.detector.locate(image) if len(faces) > 0 else []
+
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in faces]
@@ -0,0 +1,79 @@
+import logging
+import os
+from threading import Lock
+
+import cv2
+
+from objects.CaptureOptions import CaptureOptions
+from objects.Config import Config
+
+# The FFmpeg options are read from the environment, so cameras must not open their streams at the same time.
+ffmpeg_options_lock = Lock()
+
+
+# Read the capture settings of a camera section.
+def capture_options(config: Config, section: str = "Camera") -> CaptureOptions:
+    return CaptureOptions(config.camera_capture_backend(section), config.camera_capture_pipeline(section),
+                          config.camera_rtsp_transport(section), config.camera_capture_buffer_size(section),
+                          config.camera_hardware_decoding(section), config.camera_decode_width(section),
+                          config.camera_frame_skip(section))
+
+
+# Pipeline that decodes the rtsp stream without buffering and scales it down before it is converted.
+def gstreamer_pipeline(stream_link: str, options: CaptureOptions) -> str:
+    if stream_link.startswith("rtsp://"):
+        protocols = f" protocols={options.transport}" if options.transport in ("tcp", "udp") else ""
+        source = f"rtspsrc location={stream_link} latency=0{protocols}"
+    else:
+        source = f"uridecodebin uri={stream_link}"
+
+    size = f",width={options.decode_width}" if options.decode_width > 0 else ""
+    return (f"{source} ! decodebin ! videoconvert ! videoscale ! video/x-raw,format=BGR{size} ! "
+            f"appsink drop=true max-buffers=1 sync=false")
+
+
+def ffmpeg_options(options: CaptureOptions) -> str:
+    values = ["fflags;nobuffer", "flags;low_delay"]
+    if options.transport in ("tcp", "udp"):
+        values.insert(0, f"rtsp_transport;{options.transport}")
+
+    return "|".join(values)
+
+
+# Open the stream of a camera with the given settings.
+def open_capture(stream_link: str, options: CaptureOptions = None):
+    if options is None:
+        options = CaptureOptions()
+
+    # Local devices, e.g. webcams.
+    try:
+        return cv2.VideoCapture(int(stream_link) + cv2.CAP_DSHOW)
+    except ValueError:
+        pass
+
+    if len(options.pipeline) > 0:
+        capture = cv2.VideoCapture(options.pipeline, cv2.CAP_GSTREAMER)
+    elif options.backend == "gstreamer":
+        capture = cv2.VideoCapture(gstreamer_pipeline(stream_link, options), cv2.CAP_GSTREAMER)
+    else:
+        if options.backend not in ("auto", "ffmpeg"):
+            logging.warning(f"Unknown capture backend: {options.backend}. Using auto instead.")
+
+        backend = cv2.CAP_FFMPEG if options.backend == "ffmpeg" else cv2.CAP_ANY
+        params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY] if options.hardware_decoding else []
+
+        with ffmpeg_options_lock:
+            previous = os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS")
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = ffmpeg_options(options)
+            try:
+                capture = cv2.VideoCapture(stream_link, backend, params)
+            finally:
+                if previous is None:
+                    del os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"]
+                else:
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = previous
+
+    if options.buffer_size > 0 and capture.isOpened():
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, options.buffer_size)
+
+    return capture
@@ -0,0 +1,33 @@
+import logging
+import os.path
+
+from objects.Config import Config
+from objects.detector.CnnDetector import CnnDetector
+from objects.detector.FaceDetector import FaceDetector
+from objects.detector.HaarDetector import HaarDetector
+from objects.detector.HogDetector import HogDetector
+from objects.detector.YuNetDetector import YuNetDetector
+
+
+# Create the face detector selected in the config.
+def create_detector(config: Config) -> FaceDetector:
+    name = config.face_recognition_detector().lower()
+
+    if name == "cnn":
+        detector = CnnDetector(config.face_recognition_upsample())
+    elif name == "yunet" and os.path.isfile(config.face_recognition_yunet_model()):
+        detector = YuNetDetector(config.face_recognition_yunet_model())
+    elif name == "haar":
+        detector = HaarDetector()
+    else:
+        if name == "yunet":
+            logging.warning(f"YuNet model not found: {config.face_recognition_yunet_model()}. Using hog instead.")
+        elif name != "hog":
+            logging.warning(f"Unknown face detector: {name}. Using hog instead.")
+        detector = HogDetector(config.face_recognition_upsample())
+
+    if config.face_recognition_haar_prefilter() and not isinstance(detector, HaarDetector):
+        detector = HaarDetector(detector)
+
+    logging.info(f"Using face detector: {detector.name}")
+    return detector
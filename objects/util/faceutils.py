@@ -1,15 +1,123 @@
 import cv2
 import face_recognition
+import numpy as np
 
+from objects.util.regionutils import region_bounds, is_polygon, box_in_region
 
-def find_faces(image):
-    face_locations = face_recognition.face_locations(image)
-    encoded_faces = face_recognition.face_encodings(image, face_locations)
+
+# Detect and encode all faces in the image.
+# With a detection scale below 1, faces are detected on a downscaled copy but encoded on the full image.
+# With regions of interest, only faces inside of those regions are detected.
+# Without a detector, the default hog detector of face_recognition is used.
+def find_faces(image, detection_scale: float = 1.0, regions=None, detector=None):
+    face_locations = locate_faces(image, detection_scale, regions, detector)
+    encoded_faces = encode_faces(image, face_locations, detector)
     amount = len(encoded_faces)
 
     return face_locations, encoded_faces, amount
 
 
+# Encode the faces at the given boxes (top, right, bottom, left).
+def encode_faces(image, face_locations, detector=None):
+    if len(face_locations) == 0:
+        return []
+
+    if detector is not None:
+        return detector.encode(image, face_locations)
+
+    return face_recognition.face_encodings(image, face_locations)
+
+
+# Detect faces and return their boxes (top, right, bottom, left) in coordinates of the full image.
+def locate_faces(image, detection_scale: float = 1.0, regions=None, detector=None):
+    if not regions:
+        return locate_faces_scaled(image, detection_scale, detector)
+
+    height, width = image.shape[:2]
+    face_locations = []
+
+    # Only process the pixels inside of the regions and move the boxes back into the frame.
+    for region in regions:
+        left, top, right, bottom = region_bounds(region, width, height)
+        if right - left < 1 or bottom - top < 1:
+            continue
+
+        # dlib needs contiguous memory, so the crop is copied.
+        crop = np.ascontiguousarray(image[top:bottom, left:right])
+
+        for box_top, box_right, box_bottom, box_left in locate_faces_scaled(crop, detection_scale, detector):
+            box = (box_top + top, box_right + left, box_bottom + top, box_left + left)
+
+            if is_polygon(region) and not box_in_region(box, region, width, height):
+                continue
+
+            # Overlapping regions can find the same face twice.
+            if any(box_iou(box, other) > 0.5 for other in face_locations):
+                continue
+
+            face_locations.append(box)
+
+    return face_locations
+
+
+def locate_faces_scaled(image, detection_scale: float = 1.0, detector=None):
+    if detection_scale <= 0 or detection_scale >= 1:
+        return detect_faces(image, detector)
+
+    small_image = cv2.resize(image, (0, 0), fx=detection_scale, fy=detection_scale, interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+
+    return [scale_box(box, 1 / detection_scale, width, height)
+            for box in detect_faces(small_image, detector)]
+
+
+def detect_faces(image, detector=None):
+    if detector is not None:
+        return detector.locate(image)
+
+    return face_recognition.face_locations(image)
+
+
+# Intersection over union of two boxes (top, right, bottom, left).
+def box_iou(box, other) -> float:
+    top, right, bottom, left = box
+    other_top, other_right, other_bottom, other_left = other
+
+    width = min(right, other_right) - max(left, other_left)
+    height = min(bottom, other_bottom) - max(top, other_top)
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    intersection = width * height
+    union = (right - left) * (bottom - top) + (other_right - other_left) * (other_bottom - other_top) - intersection
+    return intersection / union
+
+
+# Scale a box (top, right, bottom, left) and clip it to the image size.
+def scale_box(box, factor: float, width: int, height: int):
+    top, right, bottom, left = box
+    return (min(max(round(top * factor), 0), height),
+            min(max(round(right * factor), 0), width),
+            min(max(round(bottom * factor), 0), height),
+            min(max(round(left * factor), 0), width))
+
+
+# Read an image file and encode the face in it.
+# Only takes and returns plain data, so it can run in a worker process.
+def encode_image_file(file_path: str):
+    image = cv2.imread(file_path)
+    if image is None:
+        return None, None
+
+    face_locations, encoded_faces, amount = find_faces(image)
+    return (encoded_faces[0] if amount == 1 else None), amount
+
+
+# Variance of the laplacian, higher values mean sharper images.
+def sharpness(image) -> float:
+    return float(cv2.Laplacian(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var())
+
+
 # Frame face in image
 def frame_face(frame, verified, name, left, top, right, bottom):
     color = (0, 255, 0) if verified else (0, 0, 255)
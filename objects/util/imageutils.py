@@ -0,0 +1,41 @@
+import os.path
+
+import cv2
+
+# Supported image formats, their file extensions and mimetypes.
+image_formats = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "jpg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp")
+}
+
+
+def image_extension(image_format: str) -> str:
+    return image_formats.get(image_format.lower(), image_formats["png"])[0]
+
+
+def image_mimetype(file: str) -> str:
+    extension = os.path.splitext(file)[1][1:].lower()
+    return image_formats.get(extension, image_formats["png"])[1]
+
+
+# Parameters of cv2.imwrite for the format. The quality (0-100) is ignored by png.
+def image_write_params(image_format: str, quality: int) -> list:
+    extension = image_extension(image_format)
+    if extension == "jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif extension == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+
+    # Fast compression, the history is written on slow sd cards.
+    return [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+
+# Scale the image down to the width, keeping its aspect ratio.
+def thumbnail(image, width: int):
+    height, image_width = image.shape[:2]
+    if image_width <= width:
+        return image
+
+    return cv2.resize(image, (width, max(1, round(height * width / image_width))), interpolation=cv2.INTER_AREA)
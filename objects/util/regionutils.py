@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+
+
+# Regions are lists of points (x, y) relative to the frame size (0-1).
+# Two points describe a rectangle (top left, bottom right), more points describe a polygon.
+# In the config they are written as "x,y x,y ...; x,y x,y ...".
+def parse_regions(text: str):
+    regions = []
+    for region_text in text.split(";"):
+        if len(region_text.strip()) == 0:
+            continue
+
+        region = [tuple(float(value) for value in point.split(",")) for point in region_text.split()]
+        if not is_valid_region(region):
+            raise ValueError(f"Invalid region: {region_text.strip()}")
+
+        regions.append(region)
+
+    return regions
+
+
+def regions_to_string(regions) -> str:
+    return "; ".join(" ".join(f"{x},{y}" for x, y in region) for region in regions)
+
+
+def is_valid_region(region) -> bool:
+    if len(region) < 2:
+        return False
+
+    for point in region:
+        if len(point) != 2 or not all(0 <= value <= 1 for value in point):
+            return False
+
+    return True
+
+
+def is_polygon(region) -> bool:
+    return len(region) > 2
+
+
+# Get the bounding box (left, top, right, bottom) of a region in pixels.
+def region_bounds(region, width: int, height: int):
+    xs = [x * width for x, y in region]
+    ys = [y * height for x, y in region]
+
+    return (min(max(int(min(xs)), 0), width), min(max(int(min(ys)), 0), height),
+            min(max(round(max(xs)), 0), width), min(max(round(max(ys)), 0), height))
+
+
+# Check if the center of a box (top, right, bottom, left) lies inside a polygon region.
+def box_in_region(box, region, width: int, height: int) -> bool:
+    top, right, bottom, left = box
+    contour = np.array([(x * width, y * height) for x, y in region], dtype=np.float32)
+    center = ((left + right) / 2, (top + bottom) / 2)
+
+    return cv2.pointPolygonTest(contour, center, False) >= 0
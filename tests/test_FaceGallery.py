@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from objects.AuthorizedPerson import AuthorizedPerson
+from objects.FaceGallery import FaceGallery
+
+
+class FaceGalleryIndexTest(unittest.TestCase):
+    amount: int = 40
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.encodings = rng.normal(size=(self.amount + 1, FaceGallery.encoding_size)).astype(np.float32)
+        self.persons = [AuthorizedPerson(f"p{i}", f"p{i}.jpg", "", self.encodings[i]) for i in range(self.amount)]
+
+    def assert_matches_everyone(self, gallery: FaceGallery):
+        for identity, name in enumerate(gallery.names):
+            identities, distances = gallery.match(gallery.templates[identity:identity + 1])
+            self.assertEqual(name, gallery.names[identities[0]])
+            self.assertLess(float(distances[0]), 0.1)
+
+    # Removing the first image of a person renumbers the identities of all following persons.
+    def test_renumbered_identities(self):
+        for template_mode in ("centroid", "medoid"):
+            with self.subTest(template_mode=template_mode):
+                gallery = FaceGallery(self.persons, template_mode=template_mode).with_index(2)
+                gallery = gallery.with_person(AuthorizedPerson("p0", "p0b.jpg", "", self.encodings[self.amount]))
+                gallery = gallery.without_file("p0.jpg")
+
+                self.assertEqual("p1", gallery.names[0])
+                self.assertEqual("p0", gallery.names[-1])
+                self.assert_matches_everyone(gallery)
+
+    # Another image moves the centroid of a person next to another person.
+    def test_moved_template(self):
+        centroid = self.encodings[20] + 0.3 * self.encodings[self.amount]
+        gallery = FaceGallery(self.persons, template_mode="centroid").with_index(2)
+        gallery = gallery.with_person(AuthorizedPerson("p5", "p5b.jpg", "", 2 * centroid - self.encodings[5]))
+
+        self.assert_matches_everyone(gallery)
+
+    def test_all_templates(self):
+        gallery = FaceGallery(self.persons).with_index(2)
+        gallery = gallery.with_person(AuthorizedPerson("p0", "p0b.jpg", "", self.encodings[self.amount]))
+        gallery = gallery.without_file("p0.jpg")
+
+        self.assert_matches_everyone(gallery)
+
+
+if __name__ == "__main__":
+    unittest.main()
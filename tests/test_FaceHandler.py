@@ -0,0 +1,50 @@
+import os.path
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from objects.FaceHandler import FaceHandler
+from objects.HistoryEvent import HistoryEvent
+
+
+class FaceHandlerHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.face_handler = FaceHandler()
+        self.face_handler.history_path = os.path.join(self.folder.name, "history")
+        self.face_handler.cache_path = os.path.join(self.folder.name, "cache")
+        self.face_handler.image_path = os.path.join(self.folder.name, "images")
+        self.face_handler.thumbnail_width = 16
+        self.face_handler.max_history_images = 0
+
+        self.image = np.zeros((32, 32, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.face_handler.history_store.close()
+        self.folder.cleanup()
+
+    # Two cameras that save the same person in the same second.
+    def test_events_of_the_same_second(self):
+        time = datetime(2024, 1, 31, 8, 15, 0)
+        self.face_handler.write_history_image(self.image, "Mike", time, "Front Door", 0.3)
+        self.face_handler.write_history_image(self.image, "Mike", time, "Backdoor", 0.4)
+        self.face_handler.write_history_image(self.image, "Mike", time, "Backdoor", 0.5)
+
+        events, total = self.face_handler.get_history_store().query()
+        self.assertEqual(3, total)
+        self.assertEqual(["Backdoor", "Backdoor", "Front Door"], sorted(event.camera for event in events))
+        self.assertEqual(3, len({event.file for event in events}))
+
+        for event in events:
+            self.assertTrue(os.path.isfile(os.path.join(self.face_handler.history_path, event.file)))
+            self.assertTrue(os.path.isfile(os.path.join(self.face_handler.thumbnail_path, event.file)))
+
+            # The index can be rebuilt from the file names.
+            imported = HistoryEvent.from_file_name(event.file)
+            self.assertEqual((event.time, event.person), (imported.time, imported.person))
+
+
+if __name__ == "__main__":
+    unittest.main()